@@ -24,9 +24,45 @@ THE SOFTWARE.
 """
 
 
-import random
+import zlib
+from types import MappingProxyType
+
+# Ports given to the agents created without an address: each
+# localname is mapped to a port of this range, the next free one
+# when the port was already given to another localname in this process.
+PORT_RANGE = (1024, 64024)
+allocated_ports = dict()
+
+
+def allocate_port(localname):
+    """Returns the port of an agent created without an address. The
+    same localname always gets the same port, and different localnames
+    of the same process never get the same port.
+    """
+    first, last = PORT_RANGE
+    size = last - first
+    offset = zlib.crc32(localname.encode('utf-8')) % size
+    for i in range(size):
+        port = first + (offset + i) % size
+        owner = allocated_ports.setdefault(port, localname)
+        if owner == localname:
+            return port
+    raise RuntimeError('no free port left for agent {}'.format(localname))
+
+
+# Interned AIDs by name, see intern_aid. The pool is emptied when it
+# reaches INTERNED_MAX names, so that the names received from other
+# agents cannot make it grow without bound.
+INTERNED_MAX = 65536
+interned_aids = dict()
+
 
 class AID(object):
+    # the attributes of the AID are kept in slots; an AID with
+    # name None has no localname, host and port.
+    __slots__ = ('name', 'localname', 'host', 'port', 'addresses', 'resolvers',
+                 'userDefinedProperties', 'endpoints', '__weakref__')
+
     def __init__(self, name=None, addresses=None, resolvers=None, userDefinedProperties=None):
         """
         Agent Identifier Class
@@ -35,6 +71,11 @@ class AID(object):
                 String[] addresses
                 String[] resolvers
                 ContentObject co
+
+        AIDs built by this class can be changed, and are the ones the
+        agents are created with. The AIDs of the messages received
+        from other agents are InternedAID instances, shared by all the
+        messages and never changed.
         """
 
         if name is not None:
@@ -50,7 +91,7 @@ class AID(object):
             else:
                 self.localname = name
                 self.host = 'localhost'
-                self.port = random.randint(1024, 64024)
+                self.port = allocate_port(self.localname)
                 self.name = self.localname + '@' + self.host +  ':'  + str(self.port) 
                 self.addresses = [self.host + ':' + str(self.port)]
         else:
@@ -63,6 +104,9 @@ class AID(object):
             self.userDefinedProperties = userDefinedProperties
         else:
             self.userDefinedProperties = list()  # properties
+        # extra transport endpoints published by the agent, such as
+        # {'unix': socket path}. They are not part of the identity.
+        self.endpoints = dict()
 
     def getName(self):
         """
@@ -133,6 +177,31 @@ class AID(object):
         """
         self.resolvers.append(resolver)
 
+    def getEndpoints(self):
+        """
+        returns the transport endpoints of the agent (dict)
+        """
+        return self.endpoints
+
+    def getEndpoint(self, kind):
+        """
+        returns the transport endpoint of the given kind,
+        or None if the agent does not publish one
+        """
+        return self.getEndpoints().get(kind)
+
+    def addEndpoint(self, kind, address):
+        """
+        publishes a transport endpoint of the given kind
+        """
+        self.getEndpoints()[kind] = address
+
+    def removeEndpoint(self, kind):
+        """
+        removes the transport endpoint of the given kind
+        """
+        self.getEndpoints().pop(kind, None)
+
     def getProperties(self):
         return self.userDefinedProperties
 
@@ -183,24 +252,23 @@ class AID(object):
         returns True if two AIDs are equal
         else returns False
         """
-        if other is None:
+        if self is other:
+            return True
+        if not isinstance(other, AID):
             return False
 
-        if (self.getName() is not None and other.getName() is not None
-                and self.getName() != other.getName()):
+        if (self.name is not None and other.name is not None
+                and self.name != other.name):
             return False
-        addr1 = self.getAddresses()
-        addr2 = other.getAddresses()
-        addr1.sort()
-        addr2.sort()
-        if addr1 != addr2:
+        # the lists are only sorted, in copies, when they differ
+        addr1 = self.addresses
+        addr2 = other.addresses
+        if addr1 != addr2 and sorted(addr1) != sorted(addr2):
             return False
 
-        res1 = self.getResolvers()
-        res2 = other.getResolvers()
-        res1.sort()
-        res2.sort()
-        if res1 != res2:
+        res1 = self.resolvers
+        res2 = other.resolvers
+        if res1 != res2 and sorted(res1) != sorted(res2):
             return False
 
         return True
@@ -214,6 +282,17 @@ class AID(object):
 
         return not (self == other)
 
+    def __getstate__(self):
+        # pickled as a dictionary, as the former class without slots
+        # was, so that both can read the AIDs of the other.
+        return dict((name, getattr(self, name)) for name in AID.__slots__[:-1]
+                    if hasattr(self, name))
+
+    def __setstate__(self, state):
+        self.endpoints = dict()
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def __hash__(self):
         h = hash(self.name)
         for i in self.addresses:
@@ -231,12 +310,12 @@ class AID(object):
         sb = ""
         if self.getName() is not None:
             sb = sb + ":name " + str(self.getName()) + "\n"
-        if self.getAddresses() != []:
+        if self.getAddresses():
             sb = sb + ":addresses \n(sequence\n"
             for i in self.getAddresses():
                 sb = sb + str(i) + '\n'
             sb = sb + ")\n"
-        if self.getResolvers() != []:
+        if self.getResolvers():
             sb = sb + ":resolvers \n(sequence\n"
             for i in self.getResolvers():
                 sb = sb + str(i) + '\n'
@@ -280,6 +359,83 @@ class AID(object):
 
         return sb
 
+class InternedAID(AID):
+    """AID that cannot be changed, shared by all the users of its
+    name: intern_aid returns the same instance for the same name, so
+    that comparing two of them is an identity check, and its hash is
+    computed once. Its lists are tuples and it has no endpoints.
+
+    It is pickled as a plain AID, so that the agents of older PADE
+    versions can read it, and interned again by codec.loads.
+
+    A changeable copy is given by AID(aid.name).
+    """
+
+    __slots__ = ('hash',)
+
+    def __init__(self, name):
+        aid = AID(name)
+        for attribute in AID.__slots__[:-1]:
+            if hasattr(aid, attribute):
+                object.__setattr__(self, attribute, getattr(aid, attribute))
+        object.__setattr__(self, 'addresses', tuple(aid.addresses))
+        object.__setattr__(self, 'resolvers', ())
+        object.__setattr__(self, 'userDefinedProperties', ())
+        object.__setattr__(self, 'endpoints', MappingProxyType(dict()))
+        object.__setattr__(self, 'hash', AID.__hash__(self))
+
+    def __setattr__(self, name, value):
+        raise TypeError('interned AID {} cannot be changed'.format(self.name))
+
+    __delattr__ = __setattr__
+
+    def _frozen(self, *args):
+        raise TypeError('interned AID {} cannot be changed'.format(self.name))
+
+    setLocalName = setHost = setPort = addAddress = addResolvers = _frozen
+    addEndpoint = removeEndpoint = addProperty = _frozen
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        return AID.__eq__(self, other)
+
+    def __hash__(self):
+        return self.hash
+
+    def __reduce__(self):
+        # the state of an AID, with lists and a dict of endpoints
+        state = AID.__getstate__(self)
+        state.update(addresses=list(self.addresses), resolvers=list(),
+                     userDefinedProperties=list(), endpoints=dict())
+        return AID, (), state
+
+
+def intern_aid(name):
+    """Returns the InternedAID of a name, shared by all the calls
+    with the same name.
+
+    Parameters
+    ----------
+    name : str
+        name of the agent, in the form localname@host:port
+
+    Returns
+    -------
+    InternedAID
+        AID of the agent
+    """
+    aid = interned_aids.get(name)
+    if aid is None:
+        if len(interned_aids) >= INTERNED_MAX:
+            interned_aids.clear()
+        aid = InternedAID(name)
+        # a name without address is interned under its full name too
+        aid = interned_aids.setdefault(aid.name, aid)
+        interned_aids[name] = aid
+    return aid
+
+
 if __name__ == '__main__':
     
     agentname = AID('lucas')
@@ -0,0 +1,558 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+"""
+    Binary wire codec of the ACL messages
+    -------------------------------------
+
+    This module implements a compact, versioned binary encoding of
+    ACLMessage objects, used between agents that negotiate it instead
+    of pickling the whole message object.
+
+    An encoded message starts with a fixed header: the magic b'PA',
+    the version of the codec, a flags byte, the codes of the
+    performative and of the protocol and the number of receivers. The
+    other fields follow, in a fixed order, as UTF-8 strings preceded
+    by the table of their lengths, and then the timestamp of the
+    message, the endpoints of its agents and its content. AIDs are
+    encoded as their name, and decoded as the interned AID of that
+    name, unless they publish endpoints, which are encoded after the
+    timestamp and decoded in an AID of their own. A message whose AIDs
+    carry other fields, such as other addresses, resolvers or
+    properties, is pickled instead. The content is encoded as
+    opaque bytes: strings and bytes as they are and other objects
+    pickled.
+
+    Objects are pickled with protocol 5 and their large contiguous
+    buffers, such as the data of NumPy arrays, are written out of band
+    after the pickle, so they are copied once into the payload instead
+    of being serialized, and are rebuilt on the received data itself.
+
+    decode() does not decode the content: it is kept encoded in the
+    message until it is read (see ACLMessage.get_content), and a
+    message forwarded without reading its content is encoded again
+    without decoding it.
+
+    Payloads that do not start with the magic are pickled messages,
+    so loads() reads both formats.
+"""
+
+import pickle
+import struct
+from operator import attrgetter
+
+from pade.acl import messages
+from pade.acl.aid import AID, InternedAID, intern_aid
+from pade.acl.messages import ACLMessage
+
+# Name of the format in the connection negotiation (see PeerProtocol.hello).
+# It changes with VERSION, so that the agents whose codecs differ agree
+# on pickling the messages instead. Version 2 added the timestamp.
+FORMAT = 'acl2'
+
+MAGIC = b'PA'
+VERSION = 2
+# magic, version, flags, performative code, protocol code,
+# number of receivers and number of reply-to agents
+HEADER = struct.Struct('!2sBBBBHH')
+LENGTH = struct.Struct('!H')
+CONTENT = struct.Struct('!I')
+# timestamp of the message, in nanoseconds since the epoch
+TIMESTAMP = struct.Struct('!q')
+# number of out-of-band buffers, each then preceded by its CONTENT length
+BUFFERS = struct.Struct('!I')
+# number of agents with endpoints, then for each of them its index,
+# counted from the sender through the receivers and the reply-to
+# agents, and its number of endpoints. Each endpoint is its kind, as
+# a LENGTH and UTF-8 bytes, and its value, as ENDPOINT_INT or as
+# ENDPOINT_STR and UTF-8 bytes.
+ENDPOINTS = struct.Struct('!H')
+AGENT_ENDPOINTS = struct.Struct('!HB')
+ENDPOINT_INT = struct.Struct('!Bq')
+ENDPOINT_STR = struct.Struct('!BH')
+INT_VALUE = 0
+STR_VALUE = 1
+
+# a length of NONE stands for a field set to None
+NONE = 0xffff
+MAX_LENGTH = NONE - 1
+
+# flags of the header
+FLAG_SYSTEM_MESSAGE = 0x01
+CONTENT_MASK = 0x06
+CONTENT_NONE = 0x00
+CONTENT_STR = 0x02
+CONTENT_BYTES = 0x04
+CONTENT_PICKLE = 0x06
+# the pickled content is followed by out-of-band buffers
+FLAG_BUFFERS = 0x08
+# the strings are followed by the timestamp
+FLAG_TIMESTAMP = 0x10
+# the timestamp is followed by the endpoints of the agents
+FLAG_ENDPOINTS = 0x20
+
+# buffers smaller than this are left in the pickle
+OUT_OF_BAND_SIZE = 1024
+
+# kinds of encoded content of the messages by content flag, and back
+CONTENT_KINDS = {CONTENT_STR: messages.CONTENT_STR,
+                 CONTENT_BYTES: messages.CONTENT_BYTES,
+                 CONTENT_PICKLE: messages.CONTENT_OBJECT}
+CONTENT_FLAGS = {kind: flag for flag, kind in CONTENT_KINDS.items()}
+
+# Codes of the performatives and protocols. The code CUSTOM stands for
+# a value that is not in the table, sent as the first strings.
+# New values are only ever appended, so that the codes never change.
+PERFORMATIVES = (None, 'accept-proposal', 'agree', 'cancel', 'cfp',
+                 'call-for-proposal', 'confirm', 'disconfirm', 'failure',
+                 'inform', 'not-understood', 'propose', 'query-if',
+                 'query-ref', 'refuse', 'reject-proposal', 'request',
+                 'request-when', 'request-whenever', 'subscribe',
+                 'inform-if', 'proxy', 'propagate')
+PROTOCOLS = (None, 'fipa-request protocol', 'fipa-query protocol',
+             'fipa-request-when protocol', 'fipa-contract-net protocol',
+             'fipa-subscribe-protocol')
+CUSTOM = 0xff
+
+PERFORMATIVE_CODES = dict((value, code) for code, value in enumerate(PERFORMATIVES))
+PROTOCOL_CODES = dict((value, code) for code, value in enumerate(PROTOCOLS))
+
+# string fields encoded after the sender, receivers and reply-to
+# agents, in this order
+STRING_FIELDS = ('language', 'encoding', 'ontology', 'conversation_id',
+                 'messageID', 'reply_with', 'in_reply_to', 'reply_by')
+
+
+class EncodeError(ValueError):
+    """The message has fields that the codec cannot encode, and
+    must be pickled instead."""
+
+
+def _is_named(aid):
+    # True if the AID has no other fields than the ones of the
+    # interned AID of its name, but its endpoints
+    return type(aid) is InternedAID or (
+        aid.name is not None and not aid.resolvers and not aid.userDefinedProperties
+        and list(aid.addresses) == aid.name.split('@')[1:])
+
+
+def _aid_name(aid):
+    if aid is None:
+        return None
+    if not isinstance(aid, AID):
+        raise EncodeError('agent of type {} is not an AID'.format(type(aid).__name__))
+    # only the name and the endpoints are sent
+    if not _is_named(aid):
+        raise EncodeError('agent {} has fields other than its name'.format(aid.name))
+    return aid.name
+
+
+def _intern(aid):
+    # the interned AID standing for a plain AID
+    if type(aid) is AID and not aid.endpoints and _is_named(aid):
+        return intern_aid(aid.name)
+    return aid
+
+
+_endpoints_of = attrgetter('endpoints')
+
+
+def _encode_endpoints(agents, data):
+    # appends the endpoints of the agents and returns their flag
+    published = [(index, aid.endpoints) for index, aid in enumerate(agents)
+                 if aid is not None and aid.endpoints]
+    if not published:
+        return 0
+    data.append(ENDPOINTS.pack(len(published)))
+    for index, endpoints in published:
+        if index > MAX_LENGTH or len(endpoints) > 0xff:
+            raise EncodeError('too many endpoints')
+        data.append(AGENT_ENDPOINTS.pack(index, len(endpoints)))
+        for kind, value in endpoints.items():
+            if type(kind) is not str:
+                raise EncodeError('endpoint kind of type {} is not a string'.format(
+                    type(kind).__name__))
+            kind = kind.encode('utf-8')
+            if len(kind) > MAX_LENGTH:
+                raise EncodeError('endpoint kind of {} bytes is too long'.format(len(kind)))
+            data.append(LENGTH.pack(len(kind)))
+            data.append(kind)
+            if type(value) is int:
+                data.append(ENDPOINT_INT.pack(INT_VALUE, value))
+            elif type(value) is str:
+                value = value.encode('utf-8')
+                if len(value) > MAX_LENGTH:
+                    raise EncodeError('endpoint of {} bytes is too long'.format(len(value)))
+                data.append(ENDPOINT_STR.pack(STR_VALUE, len(value)))
+                data.append(value)
+            else:
+                raise EncodeError('endpoint of type {} is not an int or a string'.format(
+                    type(value).__name__))
+    return FLAG_ENDPOINTS
+
+
+def _decode_endpoints(data, offset, agents):
+    # replaces the agents that publish endpoints by AIDs holding them
+    count, = ENDPOINTS.unpack_from(data, offset)
+    offset += ENDPOINTS.size
+    for i in range(count):
+        index, size = AGENT_ENDPOINTS.unpack_from(data, offset)
+        offset += AGENT_ENDPOINTS.size
+        aid = AID(agents[index].name)
+        for j in range(size):
+            length, = LENGTH.unpack_from(data, offset)
+            offset += LENGTH.size
+            kind = str(data[offset:offset + length], 'utf-8')
+            offset += length
+            if data[offset] == INT_VALUE:
+                value = ENDPOINT_INT.unpack_from(data, offset)[1]
+                offset += ENDPOINT_INT.size
+            elif data[offset] == STR_VALUE:
+                length = ENDPOINT_STR.unpack_from(data, offset)[1]
+                offset += ENDPOINT_STR.size
+                value = str(data[offset:offset + length], 'utf-8')
+                offset += length
+            else:
+                raise ValueError('invalid endpoint value')
+            aid.endpoints[kind] = value
+        agents[index] = aid
+    if offset > len(data):
+        raise ValueError('truncated message')
+    return offset
+
+
+def _out_of_band(buffers):
+    # buffer_callback of pickle.dumps: a false result keeps the buffer
+    # out of band, so only the large contiguous ones are collected.
+    def collect(buffer):
+        try:
+            raw = buffer.raw()
+        except BufferError:
+            return True
+        if raw.nbytes < OUT_OF_BAND_SIZE:
+            return True
+        buffers.append(raw)
+        return False
+    return collect
+
+
+def _read_buffers(data, offset):
+    # The buffers are views of the received data, so the arrays are
+    # rebuilt on it without a copy. Data that cannot be written, such
+    # as a bytes payload, is copied once so that the arrays can be.
+    count, = BUFFERS.unpack_from(data, offset)
+    offset += BUFFERS.size
+    buffers = list()
+    for i in range(count):
+        length, = CONTENT.unpack_from(data, offset)
+        offset += CONTENT.size
+        if offset + length > len(data):
+            raise ValueError('truncated message')
+        buffer = data[offset:offset + length]
+        buffers.append(bytearray(buffer) if buffer.readonly else buffer)
+        offset += length
+    return buffers, offset
+
+
+def _encode_strings(values, lengths, data):
+    # appends the lengths and the UTF-8 bytes of string fields
+    for value in values:
+        if value is None:
+            lengths.append(NONE)
+            continue
+        if type(value) is not str:
+            raise EncodeError('field of type {} is not a string'.format(type(value).__name__))
+        value = value.encode('utf-8')
+        if len(value) > MAX_LENGTH:
+            raise EncodeError('field of {} bytes is too long'.format(len(value)))
+        lengths.append(len(value))
+        data.append(value)
+
+
+def _encode_group(values):
+    # returns the lengths and the joined bytes of string fields
+    lengths = list()
+    data = list()
+    _encode_strings(values, lengths, data)
+    return lengths, b''.join(data)
+
+
+class _Envelope(object):
+    """Encoded fields of a message that a message template fixes: all
+    but the sender, the receivers, the messageID, the timestamp and
+    the content, which are encoded at each message. The names of the
+    sender and receivers of the last message are kept encoded too, as
+    the messages of a template often go to the same agents.
+    """
+
+    __slots__ = ('performative', 'protocol', 'flags', 'reply_to',
+                 'head_lengths', 'head', 'middle_lengths', 'middle',
+                 'tail_lengths', 'tail', 'agents', 'agents_lengths',
+                 'agents_data')
+
+    def __init__(self, message):
+        self.performative = PERFORMATIVE_CODES.get(message.performative, CUSTOM)
+        self.protocol = PROTOCOL_CODES.get(message.protocol, CUSTOM)
+        self.flags = FLAG_SYSTEM_MESSAGE if message.system_message else 0
+        self.reply_to = len(message.reply_to)
+        if self.reply_to > MAX_LENGTH:
+            raise EncodeError('too many agents')
+        head = list()
+        if self.performative == CUSTOM:
+            head.append(message.performative)
+        if self.protocol == CUSTOM:
+            head.append(message.protocol)
+        middle = [_aid_name(aid) for aid in message.reply_to]
+        middle += (message.language, message.encoding, message.ontology,
+                   message.conversation_id)
+        self.head_lengths, self.head = _encode_group(head)
+        self.middle_lengths, self.middle = _encode_group(middle)
+        self.tail_lengths, self.tail = _encode_group(
+            (message.reply_with, message.in_reply_to, message.reply_by))
+        self.agents = None
+
+    def encode(self, message):
+        receivers = message.receivers
+        if len(receivers) > MAX_LENGTH:
+            raise EncodeError('too many agents')
+        agents = [_aid_name(message.sender)]
+        agents += [_aid_name(aid) for aid in receivers]
+        if agents != self.agents:
+            self.agents_lengths, self.agents_data = _encode_group(agents)
+            self.agents = agents
+        lengths = self.head_lengths + self.agents_lengths
+        data = [self.head, self.agents_data]
+        lengths.extend(self.middle_lengths)
+        data.append(self.middle)
+        _encode_strings((message.messageID,), lengths, data)
+        lengths.extend(self.tail_lengths)
+        data.append(self.tail)
+
+        flags = self.flags
+        if message.timestamp is not None:
+            if type(message.timestamp) is not int:
+                raise EncodeError('timestamp is not an int')
+            flags |= FLAG_TIMESTAMP
+            data.append(TIMESTAMP.pack(message.timestamp))
+        sender = message.sender
+        if (sender is not None and sender.endpoints) or \
+                any(map(_endpoints_of, receivers)) or any(map(_endpoints_of, message.reply_to)):
+            flags |= _encode_endpoints([sender] + receivers + message.reply_to, data)
+        flags |= _encode_content(message, data)
+        header = HEADER.pack(MAGIC, VERSION, flags, self.performative, self.protocol,
+                             len(receivers), self.reply_to)
+        # a single join, so that the content is copied once
+        data[:0] = (header, struct.pack('!{}H'.format(len(lengths)), *lengths))
+        return b''.join(data)
+
+
+def _encode_content(message, data):
+    # appends the content and returns its flags
+    flags = 0
+    buffers = ()
+    encoded = message.get_encoded_content()
+    if encoded is not None:
+        kind, content, buffers = encoded
+        flags |= CONTENT_FLAGS[kind]
+        data.append(CONTENT.pack(len(content)))
+        data.append(content)
+        content = None
+    else:
+        content = message.content
+    if content is not None:
+        if type(content) is str:
+            flags |= CONTENT_STR
+            content = content.encode('utf-8')
+        elif type(content) is bytes:
+            flags |= CONTENT_BYTES
+        else:
+            flags |= CONTENT_PICKLE
+            buffers = list()
+            content = pickle.dumps(content, protocol=5,
+                                   buffer_callback=_out_of_band(buffers))
+        data.append(CONTENT.pack(len(content)))
+        data.append(content)
+    if buffers:
+        flags |= FLAG_BUFFERS
+        data.append(BUFFERS.pack(len(buffers)))
+        for buffer in buffers:
+            data.append(CONTENT.pack(len(buffer)))
+            data.append(buffer)
+    return flags
+
+
+def encode(message):
+    """Encodes an ACL message.
+
+    The header is followed by the lengths of all the string fields
+    and by their UTF-8 bytes, so that they are read in one pass, and
+    then by the length and the bytes of the content.
+
+    The fields fixed by the template of a message (see
+    MessageTemplate) are encoded once for all its messages, while
+    they are not changed.
+
+    Parameters
+    ----------
+    message : ACLMessage
+        message to be encoded
+
+    Returns
+    -------
+    bytes
+        encoded message
+
+    Raises
+    ------
+    EncodeError
+        if the message has attributes added by the user, fields that
+        are not strings or AIDs with fields other than their name, in
+        which case it must be pickled instead
+    """
+    if type(message) is not ACLMessage or message.__dict__:
+        raise EncodeError('message has attributes that are not ACL fields')
+    template = message.template
+    if template is not None and template.matches(message):
+        envelope = template.encoded.get(FORMAT)
+        if envelope is None:
+            envelope = template.encoded[FORMAT] = _Envelope(template.prototype)
+    else:
+        envelope = _Envelope(message)
+    return envelope.encode(message)
+
+
+def decode(data):
+    """Decodes an encoded ACL message.
+
+    Parameters
+    ----------
+    data : bytes-like
+        encoded message
+
+    Returns
+    -------
+    ACLMessage
+        decoded message
+
+    Raises
+    ------
+    ValueError
+        if the data is not a valid encoded message
+    """
+    data = memoryview(data)
+    try:
+        magic, version, flags, performative, protocol, receivers, reply_to = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError('not an encoded ACL message')
+        if version != VERSION:
+            raise ValueError('unsupported codec version {}'.format(version))
+        count = ((performative == CUSTOM) + (protocol == CUSTOM) + 1 +
+                 receivers + reply_to + len(STRING_FIELDS))
+        lengths = struct.unpack_from('!{}H'.format(count), data, HEADER.size)
+        offset = HEADER.size + LENGTH.size * count
+        strings = list()
+        for length in lengths:
+            if length == NONE:
+                strings.append(None)
+            else:
+                end = offset + length
+                strings.append(str(data[offset:end], 'utf-8'))
+                offset = end
+        if offset > len(data):
+            raise ValueError('truncated message')
+
+        message = ACLMessage.__new__(ACLMessage)
+        message.template = None
+        strings = iter(strings)
+        if performative == CUSTOM:
+            message.performative = next(strings)
+        else:
+            message.performative = PERFORMATIVES[performative]
+        if protocol == CUSTOM:
+            message.protocol = next(strings)
+        else:
+            message.protocol = PROTOCOLS[protocol]
+        message.system_message = bool(flags & FLAG_SYSTEM_MESSAGE)
+        sender = next(strings)
+        agents = [None if sender is None else intern_aid(sender)]
+        agents += [intern_aid(next(strings)) for i in range(receivers + reply_to)]
+        (message.language, message.encoding, message.ontology,
+         message.conversation_id, message.messageID, message.reply_with,
+         message.in_reply_to, message.reply_by) = [next(strings) for name in STRING_FIELDS]
+        if flags & FLAG_TIMESTAMP:
+            message.timestamp, = TIMESTAMP.unpack_from(data, offset)
+            offset += TIMESTAMP.size
+        else:
+            message.timestamp = None
+        if flags & FLAG_ENDPOINTS:
+            offset = _decode_endpoints(data, offset, agents)
+        message.sender = agents[0]
+        message.receivers = agents[1:receivers + 1]
+        message.reply_to = agents[receivers + 1:]
+
+        kind = flags & CONTENT_MASK
+        if kind == CONTENT_NONE:
+            message.content = None
+        else:
+            length, = CONTENT.unpack_from(data, offset)
+            offset += CONTENT.size
+            if offset + length > len(data):
+                raise ValueError('truncated message')
+            # copied, so that only out-of-band buffers hold the data
+            content = bytes(data[offset:offset + length])
+            offset += length
+            buffers = ()
+            if flags & FLAG_BUFFERS:
+                buffers, offset = _read_buffers(data, offset)
+            message.set_encoded_content(CONTENT_KINDS[kind], content, buffers)
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError('malformed message: {}'.format(e))
+    return message
+
+
+def loads(data):
+    """Returns the ACL message of a payload, either encoded by this
+    codec or pickled.
+
+    Parameters
+    ----------
+    data : bytes-like
+        payload of a frame
+
+    Returns
+    -------
+    object
+        decoded message
+    """
+    if data[:2] == MAGIC:
+        return decode(data)
+    message = pickle.loads(data)
+    if type(message) is ACLMessage:
+        # the AIDs are pickled as plain AIDs, and interned as the
+        # ones of the encoded messages
+        message.sender = _intern(message.sender)
+        message.receivers = [_intern(aid) for aid in message.receivers]
+        message.reply_to = [_intern(aid) for aid in message.reply_to]
+    return message
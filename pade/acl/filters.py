@@ -55,7 +55,7 @@ class Filter():
         if self.conversation_id != None and self.conversation_id != message.conversation_id:
             state = False
         
-        if self.sender != None and self.sender != message.sender:
+        if self.sender is not None and self.sender != message.sender:
             state = False
         
         if self.performative != None and self.performative != message.performative:
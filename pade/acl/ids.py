@@ -0,0 +1,111 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+"""
+    Message and conversation identifiers
+    ------------------------------------
+
+    This module generates the messageID and the conversation_id of the
+    ACL messages. The default generator joins a random prefix, drawn
+    once per process, and a counter, which is much cheaper than uuid1
+    and needs no lock: the counter is advanced by a single call, which
+    the interpreter does not interrupt.
+
+    The identifiers are opaque strings, unique across processes with
+    overwhelming probability, and may be replaced by any callable that
+    returns such strings through set_id_generator.
+"""
+
+import os
+from itertools import count
+
+
+class IdGenerator(object):
+    """Generates identifiers made of a random prefix and a counter.
+
+    Parameters
+    ----------
+    prefix : str, optional
+        prefix of the identifiers, random by default
+
+    Attributes
+    ----------
+    prefix : str
+        prefix of the identifiers, with its separator
+    random : bool
+        True if the prefix is random, and so drawn again by reseed
+    """
+
+    def __init__(self, prefix=None):
+        self.random = prefix is None
+        if prefix is None:
+            prefix = os.urandom(8).hex()
+        self.prefix = prefix + '-'
+        self.counter = count(1)
+
+    def reseed(self):
+        """Draws a new random prefix, if the prefix is random."""
+        if self.random:
+            self.prefix = os.urandom(8).hex() + '-'
+
+    def __call__(self):
+        return self.prefix + format(next(self.counter), 'x')
+
+
+_generator = IdGenerator()
+
+
+def new_id():
+    """Returns a new identifier from the current generator."""
+    return _generator()
+
+
+def set_id_generator(generator):
+    """Replaces the generator of the identifiers of the messages.
+
+    Parameters
+    ----------
+    generator : callable
+        function without arguments that returns a new identifier, as
+        a string, at each call. None restores the default generator.
+
+    Returns
+    -------
+    callable
+        the generator that was replaced
+    """
+    global _generator
+    previous = _generator
+    _generator = IdGenerator() if generator is None else generator
+    return previous
+
+
+def _after_fork():
+    # a forked process must not repeat the identifiers of its parent
+    if isinstance(_generator, IdGenerator):
+        _generator.reseed()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -35,12 +35,46 @@ THE SOFTWARE.
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
 from datetime import datetime
-from uuid import uuid1
-from pade.acl.aid import AID
+from time import time_ns
+import pickle
+from copy import deepcopy
+from operator import attrgetter
+from pade.acl.aid import AID, intern_aid
+from pade.acl.ids import new_id
+
+# Content types that cannot be modified in place, so a message copy
+# can share them with the original message.
+IMMUTABLE_CONTENT = (str, bytes, int, float, complex, bool, type(None))
+
+# Kinds of the content of a message, given by ACLMessage.content_type().
+# Encoded contents of the kind CONTENT_OBJECT are pickled objects, whose
+# large buffers, such as the data of NumPy arrays, may be kept out of
+# band (pickle protocol 5).
+CONTENT_NONE = 'none'
+CONTENT_STR = 'str'
+CONTENT_BYTES = 'bytes'
+CONTENT_OBJECT = 'object'
+
+
+def _decode_content(kind, data, buffers=()):
+    if kind == CONTENT_STR:
+        return str(data, 'utf-8')
+    if kind == CONTENT_BYTES:
+        return bytes(data)
+    return pickle.loads(data, buffers=buffers)
+
+
+class ACLMessage(object):
+    """Class that implements a ACLMessage message type
 
+    The fields of the message are plain attributes kept in slots, and
+    the XML representation of the message is only built when it is
+    requested by get_message(), as_xml() or to_element().
 
-class ACLMessage(ET.Element):
-    """Class that implements a ACLMessage message type
+    The content of a received message may be kept encoded, as it
+    arrived, until it is read: content_type() and content_size()
+    describe it without decoding it, and the content attribute and
+    get_content() decode it on first access.
     """
 
     ACCEPT_PROPOSAL = 'accept-proposal'
@@ -82,6 +116,27 @@ class ACLMessage(ET.Element):
     protocols = ['fipa-request protocol', 'fipa-query protocol', 'fipa-request-when protocol',
                  'fipa-contract-net protocol']
 
+    # fields of the message, in the order of its XML representation.
+    fields = ('performative', 'system_message', 'sender', 'receivers',
+              'reply_to', 'content', 'language', 'encoding', 'ontology',
+              'protocol', 'conversation_id', 'messageID', 'reply_with',
+              'in_reply_to', 'reply_by', 'datetime')
+
+    # fields kept in slots: the content and the datetime are
+    # properties, the latter given by the timestamp of the message in
+    # nanoseconds since the epoch.
+    envelope = tuple(name for name in fields
+                     if name not in ('content', 'datetime')) + ('timestamp',)
+
+    # _content is the decoded content, _encoded_content the content
+    # not decoded yet, in the form (kind, bytes, out-of-band buffers),
+    # and _loaded the last result of get_content(), in the form
+    # (loader, value). template is the MessageTemplate the message was
+    # made from, if any. __dict__ keeps the attributes added by the user
+    # to a message.
+    __slots__ = envelope + ('_content', '_encoded_content', '_loaded',
+                            'template', '__dict__', '__weakref__')
+
     def __init__(self, performative=None):
         """ This method initializes a ACLMessage object when it is instantiated.
 
@@ -89,65 +144,14 @@ class ACLMessage(ET.Element):
             It can be INFORM, CFP, AGREE, PROPOSE...
             All these types are attributes of ACLMessafe class.
         """
-        super(ACLMessage, self).__init__('ACLMessage')
-
-        self.append(ET.Element('performative'))
-        self.append(ET.Element('system-message'))
-        self.append(ET.Element('sender'))
-        self.append(ET.Element('receivers'))
-        self.append(ET.Element('reply-to'))
-        self.append(ET.Element('content'))
-        self.append(ET.Element('language'))
-        self.append(ET.Element('encoding'))
-        self.append(ET.Element('ontology'))
-        self.append(ET.Element('protocol'))
-        self.append(ET.Element('conversationID'))
-        self.append(ET.Element('messageID'))
-        self.append(ET.Element('reply-with'))
-        self.append(ET.Element('in-reply-to'))
-        self.append(ET.Element('reply-by'))
-        self.append(ET.Element('reply-by'))
-        self.append(ET.Element('datetime'))
-        
-        if performative != None:
-            if performative.lower() in self.performatives:
-                self.performative = performative.lower()
-                self.find('performative').text = self.performative
+        if performative is not None and performative.lower() in self.performatives:
+            self.performative = performative.lower()
         else:
             self.performative = None
-
-        self.conversation_id = str(uuid1())
-        self.find('conversationID').text = self.conversation_id
-
-        self.messageID = str(uuid1())
-        self.find('messageID').text = self.messageID
-
-        self.datetime = datetime.now()
-        datetime_tag = self.find('datetime')
-        day = ET.Element('day')
-        day.text = str(self.datetime.day)
-        datetime_tag.append(day)
-        month = ET.Element('month')
-        month.text = str(self.datetime.month)
-        datetime_tag.append(month)
-        year = ET.Element('year')
-        year.text = str(self.datetime.year)
-        datetime_tag.append(year)
-        hour = ET.Element('hour')
-        hour.text = str(self.datetime.hour)
-        datetime_tag.append(hour)
-        minute = ET.Element('minute')
-        minute.text = str(self.datetime.minute)
-        datetime_tag.append(minute)
-        second = ET.Element('second')
-        second.text = str(self.datetime.second)
-        datetime_tag.append(second)
-        microsecond = ET.Element('microsecond')
-        microsecond.text = str(self.datetime.microsecond)
-        datetime_tag.append(microsecond)
-
+        self.conversation_id = new_id()
+        self.messageID = new_id()
         self.system_message = False
-        self.datetime = None
+        self.timestamp = None
         self.sender = None
         self.receivers = list()
         self.reply_to = list()
@@ -159,6 +163,7 @@ class ACLMessage(ET.Element):
         self.reply_with = None
         self.in_reply_to = None
         self.reply_by = None
+        self.template = None
 
     def set_performative(self, performative):
         """Method to set the Performative parameter of the ACL message.
@@ -167,23 +172,31 @@ class ACLMessage(ET.Element):
            It can be any of the attributes of the ACLMessage class.
         """
         self.performative = performative
-        self.find('performative').text = str(performative).lower()
 
     def set_system_message(self, is_system_message):
         self.system_message = is_system_message
-        self.find('system-message').text = str(is_system_message)
 
     def set_datetime_now(self):
-        self.datetime = datetime.now()
-        datetime_tag = self.find('datetime')
-
-        datetime_tag.find('day').text = str(self.datetime.day)
-        datetime_tag.find('month').text = str(self.datetime.month)
-        datetime_tag.find('year').text = str(self.datetime.year)
-        datetime_tag.find('hour').text = str(self.datetime.hour)
-        datetime_tag.find('minute').text = str(self.datetime.minute)
-        datetime_tag.find('second').text = str(self.datetime.second)
-        datetime_tag.find('microsecond').text = str(self.datetime.microsecond)
+        self.timestamp = time_ns()
+
+    @property
+    def datetime(self):
+        """Local date and time of the message, given by its timestamp."""
+        timestamp = self.timestamp
+        if timestamp is None:
+            return None
+        seconds, nanoseconds = divmod(timestamp, 1000000000)
+        return datetime.fromtimestamp(seconds).replace(microsecond=nanoseconds // 1000)
+
+    @datetime.setter
+    def datetime(self, value):
+        if value is None:
+            self.timestamp = None
+        elif isinstance(value, datetime):
+            seconds = int(value.replace(microsecond=0).timestamp())
+            self.timestamp = seconds * 1000000000 + value.microsecond * 1000
+        else:
+            raise TypeError('datetime of type {} is not a datetime'.format(type(value).__name__))
 
     def set_sender(self, aid):
         """Method to set the agent that will send the message.
@@ -192,7 +205,6 @@ class ACLMessage(ET.Element):
         """
         if isinstance(aid, AID):
             self.sender = aid
-            self.find('sender').text = str(self.sender.name)
         else:
             self.set_sender(AID(name=aid))
 
@@ -201,13 +213,8 @@ class ACLMessage(ET.Element):
 
         :param aid: AID type object that identifies the agent that will receive the message.
         """
-
         if isinstance(aid, AID):
             self.receivers.append(aid)
-            receivers = self.find('receivers')
-            receiver = ET.Element('receiver')
-            receiver.text = str(aid.name)
-            receivers.append(receiver)
         else:
             self.add_receiver(AID(name=aid))
 
@@ -218,63 +225,180 @@ class ACLMessage(ET.Element):
 
         """
         if isinstance(aid, AID):
-            self.reply_to.append[aid]
-            reply_to = self.find('reply_to')
-            receiver = ET.Element('receiver')
-            receiver.text = str(aid.name)
-            reply_to.append(receiver)
+            self.reply_to.append(aid)
         else:
             self.add_reply_to(AID(name=aid))
 
+    @property
+    def content(self):
+        """Content of the message, decoded on first access."""
+        encoded = self._encoded_content
+        if encoded is not None:
+            self._content = _decode_content(*encoded)
+            self._encoded_content = None
+        return self._content
+
+    @content.setter
+    def content(self, data):
+        self._content = data
+        self._encoded_content = None
+        self._loaded = None
+
     def set_content(self, data):
-        if isinstance(data, ET.Element):
-            self.content = data
-            self.find('content').append(data)
-        else:
-            self.content = data
-            self.find('content').text = self.content
+        self.content = data
+
+    def set_encoded_content(self, kind, data, buffers=()):
+        """Sets the content of the message as it was received, to be
+        decoded when it is read.
+
+        :param kind: CONTENT_STR, CONTENT_BYTES or CONTENT_OBJECT.
+        :param data: encoded content (UTF-8 text, bytes or pickled object).
+        :param buffers: out-of-band buffers of a pickled object, which
+            its arrays are rebuilt on without being copied.
+        """
+        self._content = None
+        self._encoded_content = (kind, data, tuple(buffers))
+        self._loaded = None
+
+    def get_encoded_content(self):
+        """Returns the content that was not decoded yet, in the form
+        (kind, bytes, buffers), or None when the content is decoded.
+        """
+        return self._encoded_content
+
+    def get_content(self, loader=None, cache=True):
+        """Returns the content of the message. With a loader, such
+        as pickle.loads, returns the content decoded by it: the result
+        is cached, so the behaviours that read the same content with
+        the same loader decode it once. The cached object is shared by
+        all of them and must not be changed; a caller that keeps or
+        changes it gets its own copy with cache=False.
+
+        :param loader: function applied to the content, or None.
+        :param cache: False to decode a new object, not shared with
+            the other readers of the content.
+        """
+        if loader is None:
+            return self.content
+        loaded = self._loaded
+        if cache and loaded is not None and loaded[0] is loader:
+            return loaded[1]
+        content = self.content
+        if loader is pickle.loads and isinstance(content, str):
+            # tables pickled into text content by older agents
+            content = content.encode('utf-8', errors='ignore')
+        value = loader(content)
+        if cache:
+            self._loaded = (loader, value)
+        return value
+
+    def content_type(self):
+        """Returns the kind of the content without decoding it:
+        CONTENT_NONE, CONTENT_STR, CONTENT_BYTES or CONTENT_OBJECT.
+        """
+        encoded = self._encoded_content
+        if encoded is not None:
+            return encoded[0]
+        content = self._content
+        if content is None:
+            return CONTENT_NONE
+        if isinstance(content, str):
+            return CONTENT_STR
+        if isinstance(content, (bytes, bytearray)):
+            return CONTENT_BYTES
+        return CONTENT_OBJECT
+
+    def content_size(self):
+        """Returns the size of the content without decoding it: the
+        number of bytes of an encoded content, the length of a text or
+        bytes content, 0 without content and None for other objects.
+        """
+        encoded = self._encoded_content
+        if encoded is not None:
+            return len(encoded[1]) + sum(len(buffer) for buffer in encoded[2])
+        content = self._content
+        if content is None:
+            return 0
+        if isinstance(content, (str, bytes, bytearray)):
+            return len(content)
+        return None
 
     def set_language(self, data):
         self.language = data
-        self.find('language').text = str(data)
 
     def set_encoding(self, data):
         self.encoding = data
-        self.find('encoding').text = str(data)
 
     def set_ontology(self, data):
         self.ontology = data
-        self.find('ontology').text = str(data)
 
     def set_protocol(self, data):
         self.protocol = data
-        self.find('protocol').text = str(data)
 
     def set_conversation_id(self, data):
         self.conversation_id = data
-        self.find('conversationID').text = str(data)
 
     def set_message_id(self):
-        self.messageID = str(uuid1())
-        self.find('messageID').text = self.messageID
+        self.messageID = new_id()
 
     def set_reply_with(self, data):
         self.reply_with = data
-        self.find('reply-with').text = str(data)
 
     def set_in_reply_to(self, data):
         self.in_reply_to = data
-        self.find('in-reply-to').text = str(data)
 
     def set_reply_by(self, data):
         self.reply_by = data
-        self.find('reply-by').text = str(data)
+
+    def to_element(self):
+        """Builds the XML representation of the message.
+
+        :return: ElementTree Element of the message.
+        """
+        def text(value):
+            return None if value is None else str(value)
+
+        def agents(tag, aids):
+            element = ET.Element(tag)
+            for aid in aids:
+                receiver = ET.SubElement(element, 'receiver')
+                receiver.text = str(aid.name)
+            return element
+
+        root = ET.Element('ACLMessage')
+        ET.SubElement(root, 'performative').text = \
+            None if self.performative is None else str(self.performative).lower()
+        ET.SubElement(root, 'system-message').text = str(self.system_message)
+        ET.SubElement(root, 'sender').text = \
+            None if self.sender is None else str(self.sender.name)
+        root.append(agents('receivers', self.receivers))
+        root.append(agents('reply-to', self.reply_to))
+        content = ET.SubElement(root, 'content')
+        if isinstance(self.content, ET.Element):
+            content.append(self.content)
+        else:
+            content.text = text(self.content)
+        ET.SubElement(root, 'language').text = text(self.language)
+        ET.SubElement(root, 'encoding').text = text(self.encoding)
+        ET.SubElement(root, 'ontology').text = text(self.ontology)
+        ET.SubElement(root, 'protocol').text = text(self.protocol)
+        ET.SubElement(root, 'conversationID').text = text(self.conversation_id)
+        ET.SubElement(root, 'messageID').text = text(self.messageID)
+        ET.SubElement(root, 'reply-with').text = text(self.reply_with)
+        ET.SubElement(root, 'in-reply-to').text = text(self.in_reply_to)
+        ET.SubElement(root, 'reply-by').text = text(self.reply_by)
+        datetime_tag = ET.SubElement(root, 'datetime')
+        value = self.datetime
+        if value is not None:
+            for tag in ('day', 'month', 'year', 'hour', 'minute', 'second', 'microsecond'):
+                ET.SubElement(datetime_tag, tag).text = str(getattr(value, tag))
+        return root
 
     def get_message(self):
-        return ET.tostring(self)
+        return ET.tostring(self.to_element())
 
     def as_xml(self):
-        domElement = minidom.parseString(ET.tostring(self))
+        domElement = minidom.parseString(ET.tostring(self.to_element()))
         return domElement.toprettyxml()
 
     def __str__(self):
@@ -313,7 +437,7 @@ class ACLMessage(ET.Element):
         if self.reply_to:
             p = p + ":reply-to \n" + '(set\n'
             for i in self.reply_to:
-                p = p + i + '\n'
+                p = p + str(i) + '\n'
             p = p + ")\n"
 
         if self.language:
@@ -337,139 +461,65 @@ class ACLMessage(ET.Element):
 
         try:
             self.performative = aclmsg.find('performative').text
-            self.find('performative').text = self.performative
         except:
             pass
 
         try:
-            system_message = aclmsg.find('system-message').text
-            if system_message == 'True':
-                self.system_message = True
-                self.find('system-message').text = system_message
-            else:
-                self.system_message = False
-                self.find('system-message').text = system_message
+            self.system_message = aclmsg.find('system-message').text == 'True'
         except:
             pass
 
         try:
             self.conversation_id = aclmsg.find('conversationID').text
-            self.find('conversationID').text = self.conversation_id
         except:
             pass
 
         try:
             self.messageID = aclmsg.find('messageID').text
-            self.find('messageID').text = self.messageID
         except:
             pass
 
         try:
             datetime_tag = aclmsg.find('datetime')
-            my_datetime_tag = self.find('datetime')
-
-            day = int(datetime_tag.findtext('day'))
-            my_datetime_tag.find('day').text = str(day)
-            month = int(datetime_tag.findtext('month'))
-            my_datetime_tag.find('month').text = str(month)
-            year = int(datetime_tag.findtext('year'))
-            my_datetime_tag.find('year').text = str(year)
-            hour = int(datetime_tag.findtext('hour'))
-            my_datetime_tag.find('hour').text = str(hour)
-            minute = int(datetime_tag.findtext('minute'))
-            my_datetime_tag.find('minute').text = str(minute)
-            second = int(datetime_tag.findtext('second'))
-            my_datetime_tag.find('second').text = str(second)
-            microsecond = int(datetime_tag.findtext('microsecond'))
-            my_datetime_tag.find('microsecond').text = str(microsecond)
-
-            self.datetime = datetime(year=year,
-                                     month=month,
-                                     day=day,
-                                     hour=hour,
-                                     minute=minute,
-                                     second=second,
-                                     microsecond=microsecond)
-        except:
-            pass
-
-        try:
-            self.sender = AID(name = aclmsg.find('sender').text)
-            self.find('sender').text = self.sender.name
-        except:
-            pass
-
-        try:
-            receivers = aclmsg.find('receivers').getchildren()
-
-            for receiver in receivers:
-                aid = AID(name=receiver.text)
-                self.receivers.append(aid)
-                r = ET.Element('receiver')
-                r.text = aid.name
-                self.find('receivers').append(r)
+            self.datetime = datetime(year=int(datetime_tag.findtext('year')),
+                                     month=int(datetime_tag.findtext('month')),
+                                     day=int(datetime_tag.findtext('day')),
+                                     hour=int(datetime_tag.findtext('hour')),
+                                     minute=int(datetime_tag.findtext('minute')),
+                                     second=int(datetime_tag.findtext('second')),
+                                     microsecond=int(datetime_tag.findtext('microsecond')))
         except:
             pass
 
         try:
-            receivers = aclmsg.find('reply-to').getchildren()
-
-            for receiver in receivers:
-                aid = AID(name=receiver.text)
-                self.reply_to.append(aid)
-                r = ET.Element('receiver')
-                r.text = aid.name
-                self.find('reply-to').append(r)
+            self.sender = intern_aid(aclmsg.find('sender').text)
         except:
             pass
 
         try:
-            self.content = aclmsg.find('content').text
-            self.find('content').text = self.content
+            for receiver in aclmsg.find('receivers'):
+                self.receivers.append(intern_aid(receiver.text))
         except:
             pass
 
         try:
-            self.language = aclmsg.find('language').text
-            self.find('language').text = self.language
+            for receiver in aclmsg.find('reply-to'):
+                self.reply_to.append(intern_aid(receiver.text))
         except:
             pass
 
-        try:
-            self.encoding = aclmsg.find('encoding').text
-            self.find('encoding').text = self.encoding
-        except:
-            pass
-
-        try:
-            self.ontology = aclmsg.find('ontology').text
-            self.find('ontology').text = self.ontology
-        except:
-            pass
-
-        try:
-            self.protocol = aclmsg.find('protocol').text
-            self.find('protocol').text = self.protocol
-        except:
-            pass
-
-        try:
-            self.reply_with = aclmsg.find('reply-with').text
-            self.find('reply-with').text = self.reply_with
-        except:
-            pass
-
-        try:
-            self.in_reply_to = aclmsg.find('in-reply-to').text
-            self.find('in-reply-to').text = self.in_reply_to
-        except:
-            pass
-
-        try:
-            self.reply_by = aclmsg.find('reply-by').text
-            self.find('reply-by').text = self.reply_by
-        except:
-            pass
+        for name, tag in (('content', 'content'),
+                          ('language', 'language'),
+                          ('encoding', 'encoding'),
+                          ('ontology', 'ontology'),
+                          ('protocol', 'protocol'),
+                          ('reply_with', 'reply-with'),
+                          ('in_reply_to', 'in-reply-to'),
+                          ('reply_by', 'reply-by')):
+            try:
+                setattr(self, name, aclmsg.find(tag).text)
+            except:
+                pass
 
     def create_reply(self):
         """Creates a reply for the message
@@ -479,41 +529,158 @@ class ACLMessage(ET.Element):
 
         message = ACLMessage()
 
-        message.set_performative(self.performative)
-        message.set_system_message(is_system_message=self.system_message)
+        message.performative = self.performative
+        message.system_message = self.system_message
 
         if self.language:
-            message.set_language(self.language)
+            message.language = self.language
         if self.ontology:
-            message.set_ontology(self.ontology)
+            message.ontology = self.ontology
         if self.protocol:
-            message.set_protocol(self.protocol)
+            message.protocol = self.protocol
         if self.conversation_id:
-            message.set_conversation_id(self.conversation_id)
-
-        for i in self.reply_to:
-            message.add_receiver(i)
+            message.conversation_id = self.conversation_id
 
-        if not self.reply_to:
+        if self.reply_to:
+            message.receivers.extend(self.reply_to)
+        else:
             message.add_receiver(self.sender)
 
         if self.reply_with:
-            message.set_in_reply_to(self.reply_with)
+            message.in_reply_to = self.reply_with
 
         return message
 
+    def snapshot(self):
+        """Returns a copy of the message that is not affected by later
+        changes made to this message, as the receiver would get after
+        the message is serialized and deserialized.
+        The lists of receivers are copied and mutable contents
+        are deep copied.
+        """
+        message = ACLMessage.__new__(ACLMessage)
+        for name, value in zip(self.envelope, _envelope_of(self)):
+            setattr(message, name, value)
+        if self.__dict__:
+            message.__dict__.update(self.__dict__)
+        message.receivers = list(self.receivers)
+        message.reply_to = list(self.reply_to)
+        message.template = self.template
+        encoded = self._encoded_content
+        if encoded is not None and encoded[2]:
+            # the arrays of each copy must not share their data
+            kind, data, buffers = encoded
+            encoded = (kind, data, tuple(bytearray(buffer) for buffer in buffers))
+        message._encoded_content = encoded
+        message._loaded = None
+        if isinstance(self._content, IMMUTABLE_CONTENT):
+            message._content = self._content
+        else:
+            message._content = deepcopy(self._content)
+        return message
+
     def __setstate__(self, state):
-        self.__init__()
-        self.__dict__.update(state)
+        # the state is a dictionary of the attributes, as pickled
+        # by this class and by the former ElementTree based class.
+        for name in self.envelope:
+            setattr(self, name, None)
+        self.content = None
+        self.template = None
+        self.system_message = False
+        self.receivers = list()
+        self.reply_to = list()
+        if 'timestamp' in state:
+            # the datetime is only pickled for the former class
+            state = dict(state)
+            state.pop('datetime', None)
+        for name, value in state.items():
+            setattr(self, name, value)
 
     def __getstate__(self):
-        # Copy the object's state from self.__dict__ which contains
-        # all our instance attributes. Always use the dict.copy()
-        # method to avoid modifying the original state.
-        state = self.__dict__.copy()
-        # Remove the unpicklable entries.
+        # the fields and the attributes added by the user are
+        # pickled in a dictionary, as the former ElementTree based
+        # class did, so that both can read the messages of the other.
+        # The decoded content and the datetime are pickled too, as the
+        # former class reads them, and the timestamp that replaced the
+        # datetime is ignored by it.
+        state = dict(zip(self.envelope, _envelope_of(self)))
+        state['content'] = self.content
+        state['datetime'] = self.datetime
+        if self.__dict__:
+            state.update(self.__dict__)
         return state
 
+# reads all the fields but the content of a message at once
+_envelope_of = attrgetter(*ACLMessage.envelope)
+
+
+class MessageTemplate(object):
+    """Prototype of messages sent over and over, such as the periodic
+    messages of timed behaviours, that differ only in their receivers,
+    content, messageID and timestamp.
+
+    The other fields are fixed by the prototype, so that the codecs
+    encode them once for all the messages of the template. A message
+    whose fixed fields are changed after it is made is still sent,
+    but encoded as any other message.
+
+    Parameters
+    ----------
+    prototype : ACLMessage
+        message whose fields are copied by the messages of the template
+
+    Attributes
+    ----------
+    prototype : ACLMessage
+        copy of the prototype, which must not be changed
+    fixed : tuple
+        values of the fixed fields of the prototype
+    encoded : dict
+        fixed fields encoded by each codec, by format name
+    """
+
+    def __init__(self, prototype):
+        self.prototype = prototype.snapshot()
+        self.prototype.template = None
+        self.fixed = _fixed_of(self.prototype)
+        self.encoded = dict()
+
+    def message(self, content=None, receivers=None):
+        """Returns a new message of the template.
+
+        Parameters
+        ----------
+        content : optional
+            content of the message, the one of the prototype by default
+        receivers : list, optional
+            AIDs of the receivers, the ones of the prototype by default
+
+        Returns
+        -------
+        ACLMessage
+            new message, with a new messageID
+        """
+        message = self.prototype.snapshot()
+        message.template = self
+        message.messageID = new_id()
+        if receivers is not None:
+            message.receivers = list(receivers)
+        if content is not None:
+            message.content = content
+        return message
+
+    def matches(self, message):
+        """Returns True if the fixed fields of a message are still the
+        ones of the prototype.
+        """
+        return (_fixed_of(message) == self.fixed and
+                message.reply_to == self.prototype.reply_to)
+
+# reads the fields of a message fixed by its template at once
+_fixed_of = attrgetter('performative', 'protocol', 'system_message',
+                       'language', 'encoding', 'ontology', 'conversation_id',
+                       'reply_with', 'in_reply_to', 'reply_by')
+
 if __name__ == '__main__':
 
     msg = ACLMessage()
@@ -599,15 +599,10 @@ class FipaSubscribeProtocol(FipaProtocol):
             # 🔍 LOG 3: Deserialization attempt
             display_message(self.agent.aid.name, f'🔍 [SUBSCRIBE] Attempting to deserialize table...')
             
-            # CRITICAL FIX FOR PYTHON 3.12: 
-            # Ensure the content is treated as bytes before using loads()
-            raw_content = message.content
-            if isinstance(raw_content, str):
-                # If it arrived as a string (e.g., via utf-8 socket), convert it to bytes.
-                # ast.literal_eval does not work for pickle, so we fetch the raw bytes.
-                raw_content = raw_content.encode('utf-8', errors='ignore')
-                
-            table = loads(raw_content)
+            # get_content converts a str content (e.g., arrived via
+            # utf-8 socket) to bytes before loads, and caches the table
+            # for the other behaviours that read it.
+            table = message.get_content(loads)
             
         except Exception as e:
             display_message(self.agent.aid.name, f'🔍 [SUBSCRIBE] ERROR during deserialization: {e}')
@@ -34,8 +34,17 @@ library to implement distributed systems.
 """
 
 from twisted.internet import protocol, reactor
-
-from pade.core.peer import PeerProtocol
+from twisted.internet.error import CannotListenError
+from twisted.python.failure import Failure
+
+from pade.core.peer import PeerProtocol, MAX_FRAME_SIZE, FLAG_BATCH, unpack_batch
+from pade.core.pool import ConnectionPool, MessageQueue, FlowControl, Delivery, Broadcast, UNIX, HOSTED
+from pade.core.pool import PendingLimitExceeded, PRIORITY, NORMAL, LANES
+from pade.core.shm import SHM
+from pade.core.datagram import DatagramChannel, UDP, MAX_DATAGRAM_SIZE
+from pade.core import compression
+from pade.acl import codec
+from pade.core.table import AgentTable
 from pade.acl.messages import ACLMessage
 from pade.behaviours.protocols import Behaviour
 from pade.behaviours.protocols import FipaRequestProtocol, FipaSubscribeProtocol
@@ -43,7 +52,103 @@ from pade.acl.aid import AID
 from pade.misc.utility import display_message
 
 from pickle import dumps, loads
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+import os
 import random
+import traceback
+
+# Default values of the options that tune how an agent delivers
+# its messages. They can be changed through the Agent_.transport
+# attribute before the agent is started.
+TRANSPORT_DEFAULTS = {
+    # maximum number of pooled connections to the same agent
+    'max_connections_per_peer': 1,
+    # time in seconds after which an idle connection is closed
+    'idle_timeout': 30.0,
+    # maximum number of connections being opened at the same time
+    'max_in_flight': 64,
+    # largest message, in bytes, accepted from another agent
+    'max_frame_size': MAX_FRAME_SIZE,
+    # time in seconds during which the messages to the same agent are
+    # buffered and then sent together in one batch (0 buffers them
+    # until the end of the current reactor iteration). None disables it.
+    'coalesce_window': None,
+    # maximum size in bytes of one batch of coalesced messages
+    'coalesce_max_bytes': 64 * 1024,
+    # total size in bytes of the queued outbound messages above which
+    # the agent is paused, and below which it is resumed
+    'high_watermark': 64 * 1024 * 1024,
+    'low_watermark': 16 * 1024 * 1024,
+    # size in bytes of the messages queued to one agent above which
+    # that agent is blocked, and below which it is unblocked
+    'peer_high_watermark': 4 * 1024 * 1024,
+    'peer_low_watermark': 1024 * 1024,
+    # messages to agents running in the same process are handed to
+    # their react() method without serialization or sockets
+    'local_delivery': True,
+    # directory where the agent also listens on a Unix domain socket,
+    # used by the agents of the same host instead of TCP. None disables it.
+    'unix_socket_dir': None,
+    # codec offered to the agents of other hosts to compress the
+    # messages sent to them: 'zlib-acl2', 'zlib' or 'lzma'. None disables it.
+    'compression': None,
+    # smallest message, in bytes, that is compressed
+    'compression_threshold': 4 * 1024,
+    # failed connection attempts in a row after which the messages
+    # queued to an agent fail (see Agent_.delivery_failed). None
+    # retries forever.
+    'retry_max_attempts': 5,
+    # the agent receives a FAILURE message, sent by itself, for each
+    # message that could not be delivered (see Agent_.delivery_failed)
+    'failure_replies': False,
+    # delay in seconds before the first retry, doubled after each
+    # failure up to retry_max_delay, with a random jitter of +/- 50%
+    'retry_initial_delay': 0.5,
+    'retry_max_delay': 30.0,
+    # at-least-once delivery: the messages are kept until the receiver
+    # acknowledges them and are sent again if the connection is lost.
+    # The receivers drop the copies they have already processed.
+    'reliable': False,
+    # largest number of messages sent through a connection and not
+    # acknowledged yet by a reliable receiver. The connection sends no
+    # more messages until the receiver acknowledges some of them.
+    'max_unacked': 1024,
+    # number of the last message IDs remembered by a receiver
+    # to drop the copies sent again by reliable senders
+    'dedup_window': 4096,
+    # time in seconds after which a message that is still queued
+    # expires, when neither send() nor the reply_by of the message
+    # gives one. None keeps the messages until they are sent.
+    'message_ttl': None,
+    # time in seconds between the checks for expired messages
+    'expiry_interval': 1.0,
+    # number of the last expired messages kept in dead_letters
+    'dead_letters': 1000,
+    # largest total size in bytes of the queued outbound messages.
+    # Messages above it are refused (see Agent_.delivery_failed).
+    'max_pending_bytes': 256 * 1024 * 1024,
+    # size in bytes of the shared memory ring that the agents of the
+    # same host create to send messages to this agent. None disables it.
+    'shm_ring_size': None,
+    # performatives sent and processed in the priority lane, ahead of
+    # the application traffic, as the system messages are
+    'priority_performatives': ('cancel',),
+    # largest number of received messages processed in one reactor
+    # iteration before the reactor handles other events
+    'inbox_batch': 64,
+    # UDP port where the agent receives the messages sent with
+    # send(message, unreliable=True), 0 to let the system choose
+    # one. None disables it.
+    'udp_port': None,
+    # largest datagram, in bytes, sent to the UDP port of an agent.
+    # Larger messages are sent through the connections.
+    'udp_max_size': MAX_DATAGRAM_SIZE,
+    # format of the messages offered to the other agents: 'acl2' for
+    # the binary codec of pade.acl.codec, which is used with the agents
+    # that accept it. None always pickles the messages.
+    'wire_format': codec.FORMAT,
+}
 
 
 class AgentProtocol(PeerProtocol):
@@ -78,7 +183,8 @@ class AgentProtocol(PeerProtocol):
         """This method is always executed when
         a conection is established between an agent
         in client mode and an agent in server mode.
-        Now, nothing is made here.
+        Outbound connections are registered in the
+        connection pool of the factory.
         """
         PeerProtocol.connectionMade(self)
 
@@ -90,11 +196,54 @@ class AgentProtocol(PeerProtocol):
         reason : twisted exception
             Identifies the problem in the lost connection.
         """
-        if self.message is not None:
+        if self.pool_key is not None:
+            self.fact.pool.connection_lost(self, reason)
+        self.close_ring()
+        if self.message is not None and not self.framed:
             message = PeerProtocol.connectionLost(self, reason)
             self.message = None
-            # executes the behaviour Agent.react to the received message.
-            self.fact.react(message)
+            # queues the received message for Agent.react.
+            if message is not None:
+                self.fact.receive(message)
+
+    def frame_received(self, payload, flags):
+        """This method is executed for each framed message
+        received by the agent.
+
+        Parameters
+        ----------
+        payload : bytes-like
+            serialized ACL message, or a batch of them
+        flags : int
+            flags of the frame header
+        """
+        if flags & FLAG_BATCH:
+            for item in unpack_batch(payload):
+                self.message_received(item)
+        else:
+            self.message_received(payload)
+
+    def message_received(self, payload):
+        """Deserializes a received message and queues it
+        for the agent's react method.
+
+        Parameters
+        ----------
+        payload : bytes-like
+            serialized ACL message
+        """
+        if self.acking:
+            self.acks += 1
+        try:
+            message = codec.loads(payload)
+        except Exception:
+            print('Message not understood')
+            return
+        # reliable senders send the message again when they do not
+        # get its acknowledgement, so copies already seen are dropped.
+        if self.acking and self.fact.is_duplicate(message):
+            return
+        self.fact.receive(message)
 
     def send_message(self, message):
         """This method call the functionality send_message from
@@ -136,23 +285,108 @@ class AgentFactory(protocol.ClientFactory):
         A dictionary of form: {'name': ams_IP, 'port': ams_port}
     ams_aid : AID
         AID of AMS
+    local_factories : dictionary
+        class attribute with the factories of the agents listening
+        in this process, with keys: agent name and values: AgentFactory
+    local_delivery : bool
+        If True, messages to agents of this process skip the network
+    expiry_interval : float
+        time in seconds between the checks for expired messages
+    expiry : IDelayedCall
+        next check for expired messages, or None
+    dead_letters : deque
+        last messages that expired before being sent, in the
+        form (receiver, message)
+    reliable : bool
+        If True, messages are sent again until the receiver
+        acknowledges them
+    received_ids : OrderedDict
+        IDs of the last messages received from reliable senders,
+        used to drop the copies sent again
+    dedup_window : int
+        number of message IDs kept in received_ids
+    compression : str
+        codec offered to the agents of other hosts, or None
+    compression_threshold : int
+        smallest message, in bytes, that is compressed
+    wire_format : str
+        format of the messages offered to the other agents, or None
+    shm_ring_size : int
+        size of the shared memory ring the agents of the same host
+        create to send messages to this agent, or None when the agent
+        does not accept shared memory
+    broadcast_times : deque
+        completion times of the last messages sent to several
+        receivers, in the form (messageID, receivers, seconds)
     conn_count : int
         Number of active connections
     debug : Boolean
         If True activate the debug mode
-    messages : list
-        List of messages to be sent to another agents
+    max_frame_size : int
+        Largest message, in bytes, accepted from another agent
+    messages : MessageQueue
+        Messages to be sent to another agents, in the form
+        (receiver, message, serialized message), queued per
+        destination. messages.depths() gives the pending depth
+        of each destination
+    pool : ConnectionPool
+        pool of outbound connections to another agents
+    flow : FlowControl
+        watermarks of the queued outbound messages
+    priority_performatives : frozenset
+        performatives of the messages sent and processed in the
+        PRIORITY lane, besides the system messages
+    inbox : tuple
+        received messages waiting for the react method, in one
+        deque per priority lane. inbox_depths() gives their depths
+    inbox_batch : int
+        largest number of received messages processed in one
+        reactor iteration
     on_start : method
         method that executes the agent's behaviour defined both
         by the user and by the System-PADE when the agent is initialised
     react : method
         method that executes the agent's behaviour defined 
         both by the user and by the System-PADE.
-    table : dictionary
+    stats : Counter
+        counters of the message delivery, such as the number of
+        serializations made (encodes) and the number avoided by
+        sharing them between receivers (encodes_saved), the
+        messages handed to agents of this process (local_deliveries),
+        the messages queued while the agent or their receiver
+        was above its watermark (throttled_sends) and the messages
+        written to shared memory rings (shm_sends). Compressed frames
+        are counted in compressed_frames, compression_bytes_before
+        and compression_bytes_after, messages that could not be
+        delivered in delivery_failures, messages that expired in
+        expired_messages and copies of received messages dropped
+        in duplicates. Messages sent and received in the priority
+        lane are counted in priority_sends and priority_received,
+        the datagrams in the counters of DatagramChannel, the
+        copies not sent to agent hosts in hosted_sends_saved and the
+        messages pickled because the binary codec could not encode
+        them in codec_fallbacks
+    unix_port : IListeningPort
+        Unix domain socket where the agent listens, if enabled
+    datagrams : DatagramChannel
+        UDP socket of the agent, opened with the factory when it
+        listens on the udp_port, or when it sends its first
+        datagram, or None
+    datagram_port : IListeningPort
+        UDP port bound by datagrams, or None
+    udp_port : int
+        UDP port where the agent listens, 0 for a port chosen by
+        the system, or None
+    udp_max_size : int
+        largest datagram sent, header included
+    table : AgentTable
         table stores the active agents, a dictionary with keys: name and
-        values: AID
+        values: AID, indexed by name and localname. Any dictionary
+        assigned to it is converted to an AgentTable.
     """
 
+    local_factories = dict()
+
     def __init__(self, agent_ref):
         """Init the AgentFactory class
         
@@ -167,12 +401,282 @@ class AgentFactory(protocol.ClientFactory):
         self.debug = agent_ref.debug
         self.aid = agent_ref.aid  # stores the agent's identity.
         self.ams = agent_ref.ams  # stores the  ams agent's identity.
-        self.messages = []
+        self.max_frame_size = agent_ref.transport['max_frame_size']
+        self.stats = Counter()
+        self.broadcast_times = deque(maxlen=100)
+        self.flow = FlowControl(high_watermark=agent_ref.transport['high_watermark'],
+                                low_watermark=agent_ref.transport['low_watermark'],
+                                peer_high_watermark=agent_ref.transport['peer_high_watermark'],
+                                peer_low_watermark=agent_ref.transport['peer_low_watermark'],
+                                max_pending=agent_ref.transport['max_pending_bytes'])
+        self.messages = MessageQueue(self.flow)
+        self.pool = ConnectionPool(self,
+                                   max_per_peer=agent_ref.transport['max_connections_per_peer'],
+                                   idle_timeout=agent_ref.transport['idle_timeout'],
+                                   max_in_flight=agent_ref.transport['max_in_flight'],
+                                   coalesce_window=agent_ref.transport['coalesce_window'],
+                                   coalesce_max_bytes=agent_ref.transport['coalesce_max_bytes'],
+                                   retry_max_attempts=agent_ref.transport['retry_max_attempts'],
+                                   retry_initial_delay=agent_ref.transport['retry_initial_delay'],
+                                   retry_max_delay=agent_ref.transport['retry_max_delay'])
+        self.expiry_interval = agent_ref.transport['expiry_interval']
+        self.expiry = None
+        self.dead_letters = deque(maxlen=agent_ref.transport['dead_letters'])
+        self.reliable = agent_ref.transport['reliable']
+        self.max_unacked = agent_ref.transport['max_unacked']
+        self.failure_replies = agent_ref.transport['failure_replies']
+        self.received_ids = OrderedDict()
+        self.dedup_window = agent_ref.transport['dedup_window']
+        self.local_delivery = agent_ref.transport['local_delivery']
+        self.compression = agent_ref.transport['compression']
+        if self.compression is not None and self.compression not in compression.CODECS:
+            raise ValueError('Unknown compression codec: {}'.format(self.compression))
+        self.compression_threshold = agent_ref.transport['compression_threshold']
+        self.wire_format = agent_ref.transport['wire_format']
+        if self.wire_format not in (None, codec.FORMAT):
+            raise ValueError('Unknown wire format: {}'.format(self.wire_format))
+        self.priority_performatives = frozenset(agent_ref.transport['priority_performatives'])
+        self.inbox = tuple(deque() for name in LANES)
+        self.inbox_batch = agent_ref.transport['inbox_batch']
+        self.processing = None
+        self.unix_port = None
+        self.unix_opening = False
+        self.datagrams = None
+        self.datagram_port = None
+        self.udp_port = agent_ref.transport['udp_port']
+        self.udp_max_size = agent_ref.transport['udp_max_size']
+        if self.udp_port is not None:
+            # the UDP port is bound here, so that the port chosen by the
+            # system when udp_port is 0 is published before the agent
+            # subscribes to the AMS.
+            try:
+                self.open_datagrams(self.udp_port)
+            except CannotListenError as e:
+                display_message(self.aid.name, f'UDP port disabled: {e}')
+            else:
+                self.aid.addEndpoint(UDP, self.datagram_port.getHost().port)
+        socket_dir = agent_ref.transport['unix_socket_dir']
+        if socket_dir is not None:
+            # the endpoint is published before the agent subscribes to
+            # the AMS, so it reaches the table of the other agents.
+            self.aid.addEndpoint(UNIX, os.path.join(
+                socket_dir, '{}-{}.sock'.format(self.aid.localname, self.aid.port)))
+        self.shm_ring_size = agent_ref.transport['shm_ring_size']
+        if self.shm_ring_size is not None:
+            self.aid.addEndpoint(SHM, self.shm_ring_size)
         self.react = agent_ref.react
         self.on_start = agent_ref.on_start
         self.ams_aid = AID('ams@' + self.ams['name'] + ':' + str(self.ams['port']))
         self.table = dict([('ams', self.ams_aid)])
 
+    @property
+    def table(self):
+        """Table of active agents
+        """
+        return self.__table
+
+    @table.setter
+    def table(self, value):
+        """Table of active agents
+        """
+        if isinstance(value, AgentTable):
+            self.__table = value
+        else:
+            self.__table = AgentTable(value)
+
+    def startFactory(self):
+        """This method is called when the agent starts listening
+        on its TCP port. It also starts listening on the agent's
+        Unix domain socket, when it is enabled, and
+        registers the agent for the delivery of messages sent within
+        this process.
+        """
+        AgentFactory.local_factories[self.aid.name] = self
+        path = self.aid.getEndpoint(UNIX)
+        if path is not None and self.unix_port is None and not self.unix_opening:
+            # listenUNIX starts this factory again before binding the
+            # socket, which must not try to listen on it a second time.
+            self.unix_opening = True
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self.unix_port = reactor.listenUNIX(path, self, wantPID=True)
+            except (OSError, CannotListenError) as e:
+                self.aid.removeEndpoint(UNIX)
+                display_message(self.aid.name, f'Unix socket disabled: {e}')
+            finally:
+                self.unix_opening = False
+
+    def stopFactory(self):
+        """This method is called when the agent stops listening.
+        """
+        if AgentFactory.local_factories.get(self.aid.name) is self:
+            del AgentFactory.local_factories[self.aid.name]
+
+    def open_datagrams(self, port=0):
+        """Opens the UDP socket of the agent.
+
+        Parameters
+        ----------
+        port : int, optional
+            UDP port, 0 to let the system choose one
+
+        Returns
+        -------
+        DatagramChannel
+            UDP channel of the agent
+        """
+        self.datagrams = DatagramChannel(self, self.udp_max_size)
+        try:
+            self.datagram_port = reactor.listenUDP(port, self.datagrams)
+        except CannotListenError:
+            self.datagrams = None
+            raise
+        return self.datagrams
+
+    def is_duplicate(self, message):
+        """Returns True if a message with the same messageID was
+        received recently, and remembers the messageID otherwise.
+
+        Parameters
+        ----------
+        message : ACLMessage
+            received message
+        """
+        message_id = getattr(message, 'messageID', None)
+        if message_id is None:
+            return False
+        if message_id in self.received_ids:
+            self.stats['duplicates'] += 1
+            return True
+        self.received_ids[message_id] = None
+        if len(self.received_ids) > self.dedup_window:
+            self.received_ids.popitem(last=False)
+        return False
+
+    def delivery_failed(self, delivery, reason):
+        """Called by the connection pool for each message that could
+        not be delivered to its receiver, and reports it to the agent.
+
+        Parameters
+        ----------
+        delivery : Delivery
+            message that failed
+        reason : twisted failure
+            Identifies the problem, or None
+        """
+        self.stats['delivery_failures'] += 1
+        delivery.done()
+        try:
+            self.agent_ref.delivery_failed(delivery.message, delivery.receiver, reason)
+        except Exception:
+            traceback.print_exc()
+
+    def schedule_expiry(self, deadline):
+        """Schedules the check for expired messages at the deadline
+        given, but not earlier than expiry_interval seconds from now,
+        unless a check is already scheduled.
+
+        Parameters
+        ----------
+        deadline : float
+            reactor time when a queued message expires
+        """
+        if self.expiry is None:
+            delay = max(self.expiry_interval, deadline - reactor.seconds())
+            self.expiry = reactor.callLater(delay, self.expire)
+
+    def expire(self):
+        """Removes the queued messages whose time-to-live ran out
+        and keeps them in dead_letters.
+        """
+        self.expiry = None
+        expired, next_deadline = self.messages.expire(reactor.seconds())
+        for key, delivery in expired:
+            self.message_expired(delivery)
+        if next_deadline is not None:
+            self.schedule_expiry(next_deadline)
+
+    def message_expired(self, delivery):
+        """Called for each message that expired before being sent.
+
+        Parameters
+        ----------
+        delivery : Delivery
+            message that expired
+        """
+        self.stats['expired_messages'] += 1
+        self.dead_letters.append((delivery.receiver, delivery.message))
+        delivery.done()
+
+    def lane(self, message):
+        """Returns the priority lane of a message: PRIORITY for
+        the system messages and the priority performatives, and
+        NORMAL for the others.
+
+        Parameters
+        ----------
+        message : ACLMessage
+            message sent or received
+        """
+        if (getattr(message, 'system_message', False) or
+                getattr(message, 'performative', None) in self.priority_performatives):
+            return PRIORITY
+        return NORMAL
+
+    def receive(self, message):
+        """Queues a received message in its lane of the inbox,
+        to be processed by the react method of the agent.
+
+        Parameters
+        ----------
+        message : ACLMessage
+            received message
+        """
+        lane = self.lane(message)
+        if lane == PRIORITY:
+            self.stats['priority_received'] += 1
+        self.inbox[lane].append(message)
+        if self.processing is None:
+            self.processing = reactor.callLater(0, self.process_inbox)
+
+    def deliver_local(self, message):
+        """Queues a message sent by an agent of the same process.
+
+        Parameters
+        ----------
+        message : ACLMessage
+            snapshot of the message sent
+        """
+        self.receive(message)
+
+    def process_inbox(self):
+        """Executes the react method of the agent for at most
+        inbox_batch received messages, the ones of the PRIORITY lane
+        first, and schedules the next batch if messages remain.
+        """
+        self.processing = None
+        for count in range(self.inbox_batch):
+            for lane in self.inbox:
+                if lane:
+                    message = lane.popleft()
+                    break
+            else:
+                return
+            # errors are reported here so that they do not stop
+            # the processing of the messages queued behind this one.
+            try:
+                self.react(message)
+            except Exception:
+                traceback.print_exc()
+        if any(self.inbox):
+            self.processing = reactor.callLater(0, self.process_inbox)
+
+    def inbox_depths(self):
+        """Returns the number of received messages waiting in
+        each priority lane, in the form {lane name: depth}.
+        """
+        return dict((name, len(lane)) for name, lane in zip(LANES, self.inbox))
+
     def buildProtocol(self, addr):
         """This method initializes the Agent protocol
         
@@ -189,6 +693,60 @@ class AgentFactory(protocol.ClientFactory):
         protocol = AgentProtocol(self)
         return protocol
 
+    def broadcast_done(self, broadcast, elapsed):
+        """This method is called when a message sent to several
+        receivers has been handed to the connections of all of them.
+
+        Parameters
+        ----------
+        broadcast : Broadcast
+            delivery tracker of the message
+        elapsed : float
+            time in seconds since the message was sent
+        """
+        message = broadcast.message
+        self.stats['broadcasts'] += 1
+        self.broadcast_times.append((message.messageID, broadcast.receivers, elapsed))
+        if self.debug:
+            display_message(self.aid.name, 'Message {} delivered to {} receivers in {:.3f} s'.format(
+                message.messageID, broadcast.receivers, elapsed))
+        if not message.system_message:
+            from pade.misc.data_logger import logger
+            logger.log_event(
+                event_type="broadcast_completed",
+                agent_id=self.aid.name,
+                data={
+                    "message_id": str(message.messageID),
+                    "receivers": broadcast.receivers,
+                    "seconds": elapsed,
+                },
+            )
+
+    def encode(self, message, wire_format=None):
+        """Serializes a message to be sent to other agents.
+
+        Parameters
+        ----------
+        message : ACLMessage
+            message to be serialized
+        wire_format : str, optional
+            codec.FORMAT to use the binary codec of the ACL messages.
+            Messages it cannot encode, and all messages when it is
+            None, are pickled.
+
+        Returns
+        -------
+        bytes
+            serialized message
+        """
+        self.stats['encodes'] += 1
+        if wire_format == codec.FORMAT:
+            try:
+                return codec.encode(message)
+            except codec.EncodeError:
+                self.stats['codec_fallbacks'] += 1
+        return dumps(message)
+
     def clientConnectionFailed(self, connector, reason):
         """This method is called upon a failure 
         in the connection between client and server.
@@ -248,6 +806,8 @@ class Agent_(object):
         Sniffer address
     system_behaviours : list
         List of PADE system's behaviours
+    transport : dictionary
+        Options of the message delivery, see TRANSPORT_DEFAULTS
     """
 
     def __init__(self, aid, debug=False):
@@ -267,6 +827,7 @@ class Agent_(object):
         # ALL: create a aid object with the aid of ams
         self.ams = dict()
         self.sniffer = dict()
+        self.transport = dict()
         self.behaviours = list()
         self.system_behaviours = list()
         self.__messages = list()
@@ -349,6 +910,23 @@ class Agent_(object):
             except Exception as e:
                 raise e
 
+    @property
+    def transport(self):
+        """Transport options
+        """
+        return self.__transport
+
+    @transport.setter
+    def transport(self, value):
+        """Transport options. Options not given keep
+        their default values.
+        """
+        self.__transport = dict(TRANSPORT_DEFAULTS)
+        for option in value:
+            if option not in TRANSPORT_DEFAULTS:
+                raise ValueError('unknown transport option: ' + str(option))
+            self.__transport[option] = value[option]
+
     @property
     def behaviours(self):
         """Summary
@@ -443,11 +1021,11 @@ class Agent_(object):
             except Exception as e:
                 display_message(self.aid.name, f'⚠️ LOGGER ERROR (REACT): {e}')
         
-        # Formats the content for safe terminal display
-        formatted_content = format_message_content(getattr(message, 'content', ''))
-        
-        # Log the received message (only in debug mode)
+        # Log the received message (only in debug mode). The content
+        # is only decoded and formatted for display here: behaviours
+        # that do not read it leave it encoded.
         if self.debug:
+            formatted_content = format_message_content(getattr(message, 'content', ''))
             display_message(self.aid.name, f'📨 Message: {formatted_content}')
         
         # Normal message processing
@@ -466,9 +1044,23 @@ class Agent_(object):
             _message.set_system_message(is_system_message=True)
             self.send(_message)
 
-    def send(self, message):
+    def send(self, message, ttl=None, unreliable=False):
         """This method calls the method self._send to sends 
         an ACL message to the agents specified in the receivers
+
+        Parameters
+        ----------
+        message : ACLMessage
+            Message to be sent
+        ttl : float, optional
+            time in seconds after which the message expires if it
+            could not be sent. By default it is given by the reply_by
+            of the message or by the message_ttl transport option.
+        unreliable : bool, optional
+            If True, the message is sent in one UDP datagram to the
+            receivers that publish a UDP port, and may be lost or
+            arrive out of order. Messages larger than the udp_max_size
+            transport option are sent through the connections.
         """
         message.set_sender(self.aid)
         
@@ -479,7 +1071,6 @@ class Agent_(object):
             message.set_datetime_now()
 
         from pade.misc.data_logger import logger
-        from twisted.internet import reactor
         
         sender_obj = getattr(message, 'sender', None)
         sender_name = getattr(sender_obj, 'name', '') if sender_obj else ""
@@ -500,17 +1091,31 @@ class Agent_(object):
                 },
             )
 
-        c = 0.0
+        # all the receivers are queued at once: the connection pool
+        # limits how many connections are opened at the same time.
         receivers_list = getattr(message, 'receivers', [])
-        if len(receivers_list) >= 20:
-            receivers_chunks = [receivers_list[i:i+20] for i in range(0, len(receivers_list), 20)]
-            for r in receivers_chunks:
-                reactor.callLater(c, self._send, message, r)
-                c += 0.5
-        else:
-            self._send(message, receivers_list)
+        self._send(message, receivers_list, ttl, unreliable)
 
-    def _send(self, message, receivers):
+    def _deadline(self, message, ttl):
+        """Returns the reactor time when a message sent now
+        expires, or None.
+        """
+        if ttl is None:
+            reply_by = getattr(message, 'reply_by', None)
+            if isinstance(reply_by, str):
+                try:
+                    reply_by = datetime.fromisoformat(reply_by)
+                except ValueError:
+                    reply_by = None
+            if isinstance(reply_by, datetime):
+                ttl = (reply_by - datetime.now(reply_by.tzinfo)).total_seconds()
+            else:
+                ttl = self.transport['message_ttl']
+        if ttl is None:
+            return None
+        return reactor.seconds() + ttl
+
+    def _send(self, message, receivers, ttl=None, unreliable=False):
         """This method effectively sends the message to receivers
         by connecting the receiver and sender sockets in a network
         
@@ -520,42 +1125,216 @@ class Agent_(object):
             Message to be sent
         receivers : list
             List of receivers agents
+        ttl : float, optional
+            time-to-live of the message in seconds
+        unreliable : bool, optional
+            If True, the message is sent through UDP when possible
         """
         from pade.misc.utility import display_message
         
+        # the message is serialized only once per wire format, when
+        # the first receiver is found, and the same bytes are shared
+        # by all receivers that read that format.
+        payloads = dict()
+        deadline = None
+        broadcast = None
+        lane = self.agentInstance.lane(message)
+        # destinations of the agent hosts that already got the message
+        hosts = set()
+        if len(receivers) > 1:
+            broadcast = Broadcast(message, self.agentInstance.broadcast_done)
         # "for" iterates on the message receivers
         for receiver in receivers:
-            found = False
-            for name in self.agentInstance.table:
-                # Verify that the receiver name is among the available agents.
-                # Self-addressed delivery is also allowed so that local messages
-                # can be processed normally and mirrored to the Sniffer.
-                target_aid = self.agentInstance.table[name]
-                if receiver.name == name or receiver.localname == target_aid.localname:
-                    found = True
-                    # corrects the port and host parameters randomly generated when only a name
-                    # is given as a identifier of a receiver.
-                    receiver.setPort(target_aid.port)
-                    receiver.setHost(target_aid.host)
-                    # makes a connection to the agent and sends the message.
-                    self.agentInstance.messages.append((receiver, message))
-                    if self.debug:
-                        print(('[MESSAGE DELIVERY]',
-                               message.performative,
-                               'FROM',
-                               message.sender.name,
-                               'TO',
-                               receiver.name))
-                    try:
-                        reactor.connectTCP(target_aid.host, target_aid.port, self.agentInstance)
-                    except Exception as e:
-                        self.agentInstance.messages.pop()
-                        display_message(self.aid.name, f'Error delivery message: {e}')
-                    break
-            
-            if not found:
+            # Verify that the receiver name is among the available agents.
+            # Self-addressed delivery is also allowed so that local messages
+            # can be processed normally and mirrored to the Sniffer.
+            # Receivers given only by a name are resolved to the registered
+            # host and port, without modifying the receiver AID.
+            target_aid = self.agentInstance.table.resolve(receiver)
+            if target_aid is None:
                 if self.debug:
                     display_message(self.aid.localname, 'Agent ' + receiver.name + ' is not active')
+                continue
+
+            # agents of this process get a snapshot of the message
+            # in the next reactor iteration, without serialization.
+            local = AgentFactory.local_factories.get(target_aid.name)
+            if local is not None and self.agentInstance.local_delivery:
+                self.agentInstance.stats['local_deliveries'] += 1
+                local.deliver_local(message.snapshot())
+                if broadcast is not None:
+                    broadcast.delivered()
+                continue
+
+            key = self.agentInstance.pool.route(target_aid)
+            if target_aid.getEndpoint(HOSTED) is not None:
+                # the host hands the message to all its receivers.
+                if key in hosts:
+                    self.agentInstance.stats['hosted_sends_saved'] += 1
+                    if broadcast is not None:
+                        broadcast.delivered()
+                    continue
+                hosts.add(key)
+
+            # the format is known once a connection to the agent has
+            # negotiated it, and the message is pickled until then.
+            wire_format = self.agentInstance.pool.formats.get(key)
+            payload = payloads.get(wire_format)
+            if payload is None:
+                if not payloads:
+                    deadline = self._deadline(message, ttl)
+                payload = payloads[wire_format] = self.agentInstance.encode(message, wire_format)
+            else:
+                self.agentInstance.stats['encodes_saved'] += 1
+
+            # unreliable messages go in one datagram to the agents
+            # that publish a UDP port, when they are small enough.
+            udp_port = target_aid.getEndpoint(UDP) if unreliable else None
+            if udp_port is not None:
+                datagrams = self.agentInstance.datagrams
+                if datagrams is None:
+                    datagrams = self.agentInstance.open_datagrams()
+                if datagrams.fits(payload):
+                    datagrams.send(target_aid.host, udp_port, payload)
+                    if broadcast is not None:
+                        broadcast.delivered()
+                    continue
+                self.agentInstance.stats['datagrams_oversize'] += 1
+
+            # makes a connection to the agent and sends the message.
+            if broadcast is not None:
+                broadcast.add()
+            delivery = Delivery(target_aid, message, payload, broadcast, deadline, lane)
+            # messages of the priority lane are never refused, so that
+            # system messages get through an agent that is overloaded.
+            if lane == PRIORITY:
+                self.agentInstance.stats['priority_sends'] += 1
+            elif not self.agentInstance.flow.admits(len(payload)):
+                self.agentInstance.delivery_failed(delivery, Failure(PendingLimitExceeded(
+                    'more than {} bytes queued'.format(self.agentInstance.flow.max_pending))))
+                continue
+            if deadline is not None:
+                if deadline <= reactor.seconds():
+                    self.agentInstance.message_expired(delivery)
+                    continue
+                self.agentInstance.schedule_expiry(deadline)
+            if self.agentInstance.flow.throttle(key):
+                self.agentInstance.stats['throttled_sends'] += 1
+            self.agentInstance.messages.push(key, delivery)
+            if self.debug:
+                print(('[MESSAGE DELIVERY]',
+                       message.performative,
+                       'FROM',
+                       message.sender.name,
+                       'TO',
+                       target_aid.name))
+            try:
+                self.agentInstance.pool.deliver(key, urgent=lane == PRIORITY)
+            except Exception as e:
+                if delivery in self.agentInstance.messages.get(key, ()):
+                    self.agentInstance.messages.retract(key, delivery).done()
+                display_message(self.aid.name, f'Error delivery message: {e}')
+
+        if broadcast is not None:
+            broadcast.seal()
+
+    def delivery_failed(self, message, receiver, reason):
+        """This method is called when a message could not be delivered
+        to one of its receivers, after all the connection attempts
+        failed. When the failure_replies transport option is set, the
+        agent receives a FAILURE reply to the message, sent by the agent
+        itself and naming the receiver in its content, so that the
+        behaviour waiting for the answer is notified. System messages
+        are not reported.
+
+        Parameters
+        ----------
+        message : ACLMessage
+            message that could not be delivered
+        receiver : AID
+            receiver that did not get the message
+        reason : twisted failure
+            Identifies the problem, or None
+        """
+        if message.system_message or message.performative == ACLMessage.FAILURE:
+            return
+        if self.debug:
+            display_message(self.aid.localname,
+                            'Message could not be delivered to ' + receiver.name)
+        if not self.agentInstance.failure_replies:
+            return
+        failure = message.create_reply()
+        failure.set_performative(ACLMessage.FAILURE)
+        failure.set_sender(self.aid)
+        failure.receivers = list()
+        failure.add_receiver(self.aid)
+        failure.set_content('Delivery to {} failed: {}'.format(receiver.name,
+            reason.getErrorMessage() if reason is not None else 'connection lost'))
+        self.agentInstance.deliver_local(failure)
+
+    def would_block(self, receiver=None):
+        """Returns True if a message sent now to receiver, or to any
+        agent if receiver is None, would be throttled because too many
+        outbound bytes are queued.
+
+        Parameters
+        ----------
+        receiver : AID, optional
+            receiver of the message
+
+        Returns
+        -------
+        bool
+            True if the send would be throttled
+        """
+        return self.agentInstance.flow.would_block(self._flow_key(receiver))
+
+    def wait_writable(self, receiver=None):
+        """Returns a Deferred that fires when messages can be sent
+        to receiver, or to any agent if receiver is None, without
+        being throttled.
+
+        Parameters
+        ----------
+        receiver : AID, optional
+            receiver of the message
+
+        Returns
+        -------
+        Deferred
+            fired when the outbound queue is below its watermarks
+        """
+        return self.agentInstance.flow.wait(self._flow_key(receiver))
+
+    def register_producer(self, producer):
+        """Registers an IPushProducer whose pauseProducing and
+        resumeProducing methods are called when the outbound queue
+        of the agent crosses its high and low watermarks.
+
+        Parameters
+        ----------
+        producer : IPushProducer
+            producer of outbound messages, such as a behaviour
+        """
+        self.agentInstance.flow.registerProducer(producer)
+
+    def unregister_producer(self, producer):
+        """Removes a producer registered with register_producer.
+
+        Parameters
+        ----------
+        producer : IPushProducer
+            producer of outbound messages
+        """
+        self.agentInstance.flow.unregisterProducer(producer)
+
+    def _flow_key(self, receiver):
+        if receiver is None:
+            return None
+        target_aid = self.agentInstance.table.resolve(receiver)
+        if target_aid is None:
+            return None
+        return self.agentInstance.pool.route(target_aid)
 
     def call_later(self, time, method, *args):
         """Call a method after some time delay
@@ -622,6 +1401,8 @@ class Agent_(object):
         """This method makes the agent stops listeing to its port
         """
         self.ILP.stopListening()
+        if self.agentInstance.unix_port is not None:
+            self.agentInstance.unix_port.stopListening()
 
     def resume_agent(self):
         """This method resumes the agent after it has been pause. Still not working
@@ -629,6 +1410,8 @@ class Agent_(object):
         print(self.system_behaviours,self.behaviours)
         self.on_start()
         self.ILP.startListening()
+        if self.agentInstance.unix_port is not None:
+            self.agentInstance.unix_port.startListening()
 
     def update_ams(self,ams):
         """This method instantiates the ams agent
@@ -696,7 +1479,9 @@ class SubscribeBehaviour(FipaSubscribeProtocol):
         from pade.misc.utility import display_message
         
         try:
-            table = loads(message.content)
+            # the table is kept and changed by the agent, so it is not
+            # the object shared with the other readers of the message
+            table = message.get_content(loads, cache=False)
             # Updates the local table
             self.agent.agentInstance.table = table
         except Exception as e:
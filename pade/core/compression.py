@@ -0,0 +1,174 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+
+Compression Module
+------------------
+
+This Python module implements the codecs used to compress the frames
+sent between agents. The codec of a connection is negotiated when it
+is opened (see FLAG_HELLO in pade.core.peer), so peers that do not
+know a codec keep receiving uncompressed frames.
+
+The 'zlib-acl2' codec uses a preset dictionary made of the strings
+found in the encoded and pickled messages and in the agent table,
+which also makes small messages shrink.
+"""
+
+import lzma
+import zlib
+
+
+# Preset dictionary of the 'zlib-acl2' codec, made of the encodings of
+# an INFORM with the binary codec and pickled, and of a pickled agent
+# table (see pade/tests/benchmarks/compression_dictionary.py). It must
+# be the same in all the peers, so it is never changed: a new
+# dictionary needs a new codec name. The most frequent strings are at
+# the end.
+ACL_DICTIONARY = (
+    b'\x80\x04\x95\xd2\x02\x00\x00\x00\x00\x00\x00\x8c\x11pade.acl.messages\x94\x8c\nACLMessage\x94\x93\x94)\x81'
+    b'\x94}\x94(\x8c\x0cperformative\x94\x8c\x06inform\x94\x8c\x0esystem_message\x94\x88\x8c\x06'
+    b'sender\x94\x8c\x0cpade.acl.aid\x94\x8c\x03AID\x94\x93\x94)\x81\x94}\x94(\x8c\x04name\x94\x8c\x12ams'
+    b'@localhost:8000\x94\x8c\tlocalname\x94\x8c\x03ams\x94\x8c\x04host\x94\x8c\tlocal'
+    b'host\x94\x8c\x04port\x94M@\x1f\x8c\taddresses\x94]\x94\x8c\x0elocalhost:8000\x94a\x8c'
+    b'\tresolvers\x94]\x94\x8c\x15userDefinedProperties\x94]\x94\x8c\tendpoin'
+    b'ts\x94}\x94ub\x8c\treceivers\x94]\x94h\x0b)\x81\x94}\x94(h\x0e\x8c\x17agent_1@localho'
+    b'st:20001\x94h\x10\x8c\x07agent_1\x94h\x12\x8c\tlocalhost\x94h\x14M!Nh\x15]\x94\x8c\x0flo'
+    b'calhost:20001\x94ah\x18]\x94h\x1a]\x94h\x1c}\x94\x8c\x04unix\x94\x8c\x1c/tmp/pade/ag'
+    b'ent_1-20001.sock\x94suba\x8c\x08reply_to\x94]\x94\x8c\x08language\x94N\x8c\x08'
+    b'encoding\x94N\x8c\x08ontology\x94N\x8c\x08protocol\x94\x8c\x17fipa-subscrib'
+    b'e-protocol\x94\x8c\x0fconversation_id\x94\x8c\x120123456789abcdef-'
+    b'1\x94\x8c\tmessageID\x94\x8c\x12fb211e16b9da2577-3\x94\x8c\nreply_with\x94'
+    b'N\x8c\x0bin_reply_to\x94N\x8c\x08reply_by\x94N\x8c\ttimestamp\x94\x8a\x08X=\x80\x90\xe5\xbb'
+    b'\xdf\x18\x8c\x07content\x94C\x00\x94\x8c\x08datetime\x94h=\x8c\x08datetime\x94\x93\x94C\n\x07\xea\n\x12\x15'
+    b'\t\x1f\x05\x89\xdf\x94\x85\x94R\x94ub.PA\x025\t\x05\x00\x01\x00\x00\x00\x12\x00\x17\xff\xff\xff\xff\xff\xff\x00\x12\x00\x12\xff\xff\xff\xff\xff\xffams@l'
+    b'ocalhost:8000agent_1@localhost:200010123456789ab'
+    b'cdef-1fb211e16b9da2577-3\x18\xdf\xbb\xe5\x90\x80=X\x00\x01\x00\x01\x01\x00\x04unix\x01\x00\x1c/t'
+    b'mp/pade/agent_1-20001.sock\x00\x00\x00\x00\x80\x04\x95\xfc\x01\x00\x00\x00\x00\x00\x00\x8c\x08built'
+    b'ins\x94\x8c\x04dict\x94\x93\x94}\x94(\x8c\x17agent_0@localhost:20000\x94\x8c\x0cpade'
+    b'.acl.aid\x94\x8c\x03AID\x94\x93\x94)\x81\x94}\x94(\x8c\x04name\x94h\x04\x8c\tlocalname\x94\x8c\x07ag'
+    b'ent_0\x94\x8c\x04host\x94\x8c\tlocalhost\x94\x8c\x04port\x94M N\x8c\taddresses\x94]'
+    b'\x94\x8c\x0flocalhost:20000\x94a\x8c\tresolvers\x94]\x94\x8c\x15userDefinedP'
+    b'roperties\x94]\x94\x8c\tendpoints\x94}\x94\x8c\x04unix\x94\x8c\x1c/tmp/pade/age'
+    b'nt_0-20000.sock\x94sub\x8c\x17agent_1@localhost:20001\x94h\x07)'
+    b'\x81\x94}\x94(h\nh\x1bh\x0b\x8c\x07agent_1\x94h\r\x8c\tlocalhost\x94h\x0fM!Nh\x10]\x94\x8c\x0flo'
+    b'calhost:20001\x94ah\x13]\x94h\x15]\x94h\x17}\x94h\x19\x8c\x1c/tmp/pade/agent_1'
+    b'-20001.sock\x94sub\x8c\x12ams@localhost:8000\x94h\x07)\x81\x94}\x94(h\nh&'
+    b'h\x0b\x8c\x03ams\x94h\r\x8c\tlocalhost\x94h\x0fM@\x1fh\x10]\x94\x8c\x0elocalhost:8000\x94'
+    b'ah\x13]\x94h\x15]\x94h\x17}\x94ubu\x85\x94R\x94.'
+)
+
+# Codecs known by this version, in order of preference.
+CODECS = ('zlib-acl2', 'zlib', 'lzma')
+
+ZLIB_LEVEL = 6
+LZMA_PRESET = 1
+
+
+def choose(offered):
+    """Returns the first codec of offered known by this version,
+    or None.
+
+    Parameters
+    ----------
+    offered : list
+        codec names offered by the peer
+
+    Returns
+    -------
+    str
+        codec name, or None
+    """
+    for codec in offered:
+        if codec in CODECS:
+            return codec
+    return None
+
+
+def compress(codec, data):
+    """Compresses data with a codec.
+
+    Parameters
+    ----------
+    codec : str
+        codec name, one of CODECS
+    data : bytes-like
+        data to be compressed
+
+    Returns
+    -------
+    bytes
+        compressed data
+    """
+    if codec == 'lzma':
+        return lzma.compress(data, preset=LZMA_PRESET)
+    if codec == 'zlib-acl2':
+        compressor = zlib.compressobj(ZLIB_LEVEL, zdict=ACL_DICTIONARY)
+    else:
+        compressor = zlib.compressobj(ZLIB_LEVEL)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(codec, data, max_size=None):
+    """Decompresses data compressed with a codec.
+
+    Parameters
+    ----------
+    codec : str
+        codec name, one of CODECS
+    data : bytes-like
+        compressed data
+    max_size : int, optional
+        largest size accepted for the decompressed data
+
+    Returns
+    -------
+    bytes
+        decompressed data
+
+    Raises
+    ------
+    ValueError
+        if the data is invalid or larger than max_size
+    """
+    limit = -1 if max_size is None else max_size + 1
+    try:
+        if codec == 'lzma':
+            decompressor = lzma.LZMADecompressor()
+            result = decompressor.decompress(data, limit)
+            complete = decompressor.eof
+        else:
+            if codec == 'zlib-acl2':
+                decompressor = zlib.decompressobj(zdict=ACL_DICTIONARY)
+            else:
+                decompressor = zlib.decompressobj()
+            result = decompressor.decompress(data, max(limit, 0))
+            complete = decompressor.eof
+    except (lzma.LZMAError, zlib.error) as e:
+        raise ValueError('invalid compressed data: {}'.format(e))
+    if max_size is not None and len(result) > max_size:
+        raise ValueError('decompressed data larger than {} bytes'.format(max_size))
+    if not complete:
+        raise ValueError('truncated compressed data')
+    return result
@@ -0,0 +1,230 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+
+Datagram Module
+---------------
+
+This Python module implements the UDP channel used to send small
+messages that may be lost, such as periodic measurements, without
+opening a connection to the receiver.
+
+Each message is sent in one datagram, preceded by a header with the
+sequence number of the datagram in the stream from the sender to the
+receiver and the size of the message. The receiver uses the sequence
+numbers to count the datagrams lost and received out of order.
+"""
+
+import struct
+
+from twisted.internet import protocol, reactor
+from twisted.internet.abstract import isIPAddress, isIPv6Address
+
+from pade.acl.codec import loads
+
+
+# Kind of the endpoint published in the AID by the agents that accept
+# messages through UDP. Its value is the UDP port of the agent.
+UDP = 'udp'
+
+# Each datagram starts with the magic, the version, the sequence
+# number and the size of the message that follows.
+DATAGRAM_MAGIC = b'PU'
+DATAGRAM_VERSION = 1
+DATAGRAM_HEADER = struct.Struct('!2sBxII')
+SEQUENCE_MASK = 0xffffffff
+
+# Largest datagram sent by default, header included, so that the
+# datagrams are not fragmented on Ethernet links.
+MAX_DATAGRAM_SIZE = 1400
+
+
+def pack_datagram(sequence, payload):
+    """Returns a datagram carrying a serialized message.
+
+    Parameters
+    ----------
+    sequence : int
+        sequence number of the datagram
+    payload : bytes
+        serialized message
+
+    Returns
+    -------
+    bytes
+        datagram to be sent
+    """
+    return DATAGRAM_HEADER.pack(DATAGRAM_MAGIC, DATAGRAM_VERSION,
+                                sequence & SEQUENCE_MASK, len(payload)) + payload
+
+
+def unpack_datagram(data):
+    """Returns the sequence number and the message of a datagram.
+
+    Parameters
+    ----------
+    data : bytes
+        received datagram
+
+    Returns
+    -------
+    tuple
+        (sequence, payload), payload being a memoryview of data
+
+    Raises
+    ------
+    ValueError
+        if the datagram is not a PADE datagram or is truncated
+    """
+    if len(data) < DATAGRAM_HEADER.size:
+        raise ValueError('datagram of {} bytes is too short'.format(len(data)))
+    magic, version, sequence, length = DATAGRAM_HEADER.unpack_from(data)
+    if magic != DATAGRAM_MAGIC or version != DATAGRAM_VERSION:
+        raise ValueError('not a PADE datagram')
+    if length != len(data) - DATAGRAM_HEADER.size:
+        raise ValueError('datagram of {} bytes announces a message of {} bytes'.format(
+            len(data), length))
+    return sequence, memoryview(data)[DATAGRAM_HEADER.size:]
+
+
+class DatagramChannel(protocol.DatagramProtocol):
+    """UDP socket of an agent, used to send and receive the
+    messages sent with Agent_.send(message, unreliable=True).
+
+    The counters of the channel are kept in the stats of the
+    factory: datagrams_sent, datagrams_received, datagrams_lost,
+    datagrams_reordered and datagrams_malformed.
+
+    Attributes
+    ----------
+    fact : AgentFactory
+        factory of the agent
+    max_size : int
+        largest datagram sent, header included
+    sequences : dict
+        next sequence number of the datagrams sent to each
+        address, in the form {(address, port): sequence}
+    expected : dict
+        next sequence number expected from each sender,
+        in the form {(address, port): sequence}
+    addresses : dict
+        IP addresses of the host names already resolved
+    """
+
+    def __init__(self, fact, max_size=MAX_DATAGRAM_SIZE):
+        """Init the DatagramChannel class
+
+        Parameters
+        ----------
+        fact : AgentFactory
+            factory of the agent
+        max_size : int, optional
+            largest datagram sent, header included
+        """
+        self.fact = fact
+        self.max_size = max_size
+        self.sequences = dict()
+        self.expected = dict()
+        self.addresses = dict()
+
+    def fits(self, payload):
+        """Returns True if a serialized message fits in one datagram."""
+        return DATAGRAM_HEADER.size + len(payload) <= self.max_size
+
+    def send(self, host, port, payload):
+        """Sends a serialized message in one datagram. Host names are
+        resolved once, and the message is sent when the name is
+        resolved.
+
+        Parameters
+        ----------
+        host : str
+            host name or IP address of the receiver
+        port : int
+            UDP port of the receiver
+        payload : bytes
+            serialized message, see fits()
+        """
+        if isIPAddress(host) or isIPv6Address(host):
+            self._write((host, int(port)), payload)
+        elif host in self.addresses:
+            self._write((self.addresses[host], int(port)), payload)
+        else:
+            d = reactor.resolve(host)
+            d.addCallback(self._resolved, host, port, payload)
+            d.addErrback(self._failed)
+
+    def _resolved(self, address, host, port, payload):
+        self.addresses[host] = address
+        self._write((address, int(port)), payload)
+
+    def _failed(self, reason):
+        # datagrams may be lost, so the error is only counted.
+        self.fact.stats['datagrams_failed'] += 1
+
+    def _write(self, address, payload):
+        sequence = self.sequences.get(address, 0)
+        self.sequences[address] = (sequence + 1) & SEQUENCE_MASK
+        try:
+            self.transport.write(pack_datagram(sequence, payload), address)
+        except Exception:
+            self.fact.stats['datagrams_failed'] += 1
+        else:
+            self.fact.stats['datagrams_sent'] += 1
+
+    def datagramReceived(self, data, address):
+        """Queues the message of a received datagram for the
+        react method of the agent.
+
+        Parameters
+        ----------
+        data : bytes
+            received datagram
+        address : tuple
+            address of the sender, in the form (host, port)
+        """
+        stats = self.fact.stats
+        try:
+            sequence, payload = unpack_datagram(data)
+            message = loads(payload)
+        except Exception:
+            stats['datagrams_malformed'] += 1
+            return
+        stats['datagrams_received'] += 1
+        expected = self.expected.get(address)
+        if expected is None or sequence == 0:
+            # first datagram of the sender, or the sender restarted.
+            self.expected[address] = (sequence + 1) & SEQUENCE_MASK
+        else:
+            gap = (sequence - expected) & SEQUENCE_MASK
+            if gap <= SEQUENCE_MASK // 2:
+                # the datagrams between expected and sequence are
+                # missing, until they arrive late.
+                stats['datagrams_lost'] += gap
+                self.expected[address] = (sequence + 1) & SEQUENCE_MASK
+            else:
+                stats['datagrams_reordered'] += 1
+                if stats['datagrams_lost'] > 0:
+                    stats['datagrams_lost'] -= 1
+        self.fact.receive(message)
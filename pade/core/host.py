@@ -0,0 +1,244 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+
+Agent Host Module
+-----------------
+
+This Python module implements the agent host: a process that runs
+many agents behind a single listening TCP port, instead of one
+listening port per agent.
+
+The hosted agents are registered in the AMS with the address of the
+host, so all the messages to them arrive on the same port, and the
+host hands each message to the hosted agents among its receivers,
+found by their localname. Senders that reach several agents of the
+same host send the message to the host only once.
+"""
+
+from collections import Counter, OrderedDict
+
+from twisted.internet import protocol, reactor
+
+from pade.core.agent import AgentProtocol, AgentFactory, TRANSPORT_DEFAULTS
+from pade.core.pool import HOSTED
+from pade.misc.utility import display_message
+
+
+class HostFactory(protocol.ServerFactory):
+    """Factory of the connections accepted on the port of an agent
+    host. Received messages are queued in the inbox of the hosted
+    agents they are addressed to.
+
+    Attributes
+    ----------
+    host : AgentHost
+        agent host
+    max_frame_size : int
+        Largest message, in bytes, accepted from another agent
+    compression_threshold : int
+        smallest message, in bytes, that is compressed
+    received_ids : OrderedDict
+        IDs of the last messages received from reliable senders,
+        used to drop the copies sent again
+    dedup_window : int
+        number of message IDs kept in received_ids
+    shm_ring_size : None
+        agent hosts do not accept shared memory rings
+    stats : Counter
+        counters of the host, such as the messages handed to
+        hosted agents (routed_messages) and the messages addressed
+        to no hosted agent (unroutable_messages)
+    """
+
+    # copies of received messages are dropped as the agents do.
+    is_duplicate = AgentFactory.is_duplicate
+
+    def __init__(self, host, transport=None):
+        """Init the HostFactory class
+
+        Parameters
+        ----------
+        host : AgentHost
+            agent host
+        transport : dict, optional
+            options of the connections, see TRANSPORT_DEFAULTS
+        """
+        options = dict(TRANSPORT_DEFAULTS)
+        options.update(transport or dict())
+        self.host = host
+        self.agent_ref = None
+        self.max_frame_size = options['max_frame_size']
+        self.compression_threshold = options['compression_threshold']
+        self.received_ids = OrderedDict()
+        self.dedup_window = options['dedup_window']
+        self.shm_ring_size = None
+        self.stats = Counter()
+
+    def buildProtocol(self, addr):
+        """This method initializes the Agent protocol of
+        an accepted connection.
+        """
+        return AgentProtocol(self)
+
+    def receive(self, message):
+        """Queues a received message in the inbox of the hosted
+        agents among its receivers.
+
+        Parameters
+        ----------
+        message : ACLMessage
+            received message
+        """
+        agents = list()
+        for receiver in getattr(message, 'receivers', ()):
+            agent = self.host.agents.get(receiver.localname)
+            if agent is not None and agent not in agents:
+                agents.append(agent)
+        if not agents:
+            self.stats['unroutable_messages'] += 1
+            return
+        # each agent gets its own copy, as in the delivery
+        # between agents of the same process.
+        for agent in agents[1:]:
+            agent.agentInstance.receive(message.snapshot())
+        agents[0].agentInstance.receive(message)
+        self.stats['routed_messages'] += len(agents)
+
+
+class AgentHost(object):
+    """Runs many agents of this process behind a single listening
+    TCP port, without one listening socket per agent.
+
+    Agents added to the host take its address, keep their localname
+    and publish the 'host' endpoint, so that the agents that send a
+    message to several agents of the host send it only once. Hosted
+    agents do not accept mosaik connections.
+
+    Example
+    -------
+        host = AgentHost(port=20000)
+        for i in range(10000):
+            host.add(SensorAgent(AID('sensor{}'.format(i))))
+        host.start()
+        reactor.run()
+
+    Attributes
+    ----------
+    name : str
+        name of the host, in the form host:port
+    hostname : str
+        host name or IP address published in the AIDs
+    port : int
+        TCP port of the host
+    agents : dict
+        hosted agents, with keys: localname and values: Agent
+    factory : HostFactory
+        factory of the connections accepted on the port
+    listening_port : IListeningPort
+        listening port of the host, once started
+    """
+
+    def __init__(self, port, hostname='localhost', transport=None):
+        """Init the AgentHost class
+
+        Parameters
+        ----------
+        port : int
+            TCP port of the host
+        hostname : str, optional
+            host name or IP address published in the AIDs
+        transport : dict, optional
+            options of the accepted connections, see TRANSPORT_DEFAULTS
+        """
+        self.hostname = hostname
+        self.port = int(port)
+        self.name = '{}:{}'.format(hostname, self.port)
+        self.agents = dict()
+        self.factory = HostFactory(self, transport)
+        self.listening_port = None
+
+    def add(self, agent):
+        """Adds an agent to the host, giving it the address of
+        the host. Agents must be added before they are started.
+
+        Parameters
+        ----------
+        agent : Agent
+            agent to be hosted
+
+        Raises
+        ------
+        ValueError
+            if an agent with the same localname is already hosted
+        """
+        localname = agent.aid.localname
+        if localname in self.agents:
+            raise ValueError('Agent {} is already hosted by {}'.format(localname, self.name))
+        agent.aid.setHost(self.hostname)
+        agent.aid.setPort(self.port)
+        agent.aid.addresses = [self.name]
+        agent.aid.addEndpoint(HOSTED, self.name)
+        self.agents[localname] = agent
+
+    def remove(self, agent):
+        """Stops routing the messages to a hosted agent.
+
+        Parameters
+        ----------
+        agent : Agent
+            hosted agent
+        """
+        if self.agents.get(agent.aid.localname) is agent:
+            del self.agents[agent.aid.localname]
+            if getattr(agent, 'agentInstance', None) is not None:
+                agent.agentInstance.doStop()
+
+    def start(self, ams=None):
+        """Starts the hosted agents and listens on the port of
+        the host.
+
+        Parameters
+        ----------
+        ams : dictionary, optional
+            AMS of the agents {'name': ams_IP, 'port': ams_port}.
+            By default each agent keeps its own.
+        """
+        for agent in self.agents.values():
+            agent.update_ams(ams if ams is not None else agent.ams)
+            agent.on_start()
+            # registers the agent for the delivery of the messages
+            # sent within this process, as listening would do.
+            agent.agentInstance.doStart()
+        self.listening_port = reactor.listenTCP(self.port, self.factory)
+        display_message(self.name, 'Hosting {} agents'.format(len(self.agents)))
+
+    def stop(self):
+        """Stops listening and stops the hosted agents."""
+        if self.listening_port is not None:
+            self.listening_port.stopListening()
+            self.listening_port = None
+        for agent in self.agents.values():
+            if getattr(agent, 'agentInstance', None) is not None:
+                agent.agentInstance.doStop()
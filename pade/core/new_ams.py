@@ -23,7 +23,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 from pade.core.agent import Agent_
-from pade.acl.messages import ACLMessage
+from pade.acl.messages import ACLMessage, MessageTemplate
 from pade.acl.aid import AID
 from pade.behaviours.protocols import TimedBehaviour, FipaRequestProtocol, FipaSubscribeProtocol
 from pade.misc.utility import display_message
@@ -46,11 +46,15 @@ class ComportSendConnMessages(TimedBehaviour):
     def __init__(self, agent, message, time):
         super(ComportSendConnMessages, self).__init__(agent, time)
         self.message = message
+        # each check is a new message of the same conversation, whose
+        # fixed fields are encoded once.
+        self.template = MessageTemplate(message)
 
     def on_time(self):
         super(ComportSendConnMessages, self).on_time()
-        self.agent.add_all(self.message)
-        self.agent.send(self.message)
+        message = self.template.message()
+        self.agent.add_all(message)
+        self.agent.send(message)
         if self.agent.debug:
             display_message(self.agent.aid.name, 'Checking connection...')
 
@@ -238,13 +242,9 @@ class CompVerifyRegister(FipaRequestProtocol):
     def handle_request(self, message):
         super(CompVerifyRegister, self).handle_request(message)
         
-        # CRITICAL FIX FOR PYTHON 3.12: Convert str to bytes before loads
-        raw_content = message.content
-        if isinstance(raw_content, str):
-            raw_content = raw_content.encode('utf-8', errors='ignore')
-            
+        # get_content converts a str content to bytes before loads
         try:
-            content = loads(raw_content)
+            content = message.get_content(loads)
         except Exception as e:
             display_message(self.agent.aid.name, f'Error decoding validation request: {e}')
             content = {} # Fallback
@@ -25,35 +25,448 @@ THE SOFTWARE.
 
 #from twisted.protocols.basic import LineReceiver
 from twisted.internet.protocol import Protocol
+from twisted.internet.address import UNIXAddress
+from twisted.internet import reactor
 from pade.acl.messages import ACLMessage
+from pade.core.shm import ShmRing
+from pade.core import compression
+from pade.acl import codec
+import ipaddress
 import pickle
+import struct
+
+# Agent messages are sent as frames, so that one connection carries
+# many messages back-to-back. Each frame starts with a header made of
+# a magic prefix, which tells agent frames apart from Mosaik messages
+# and from unframed messages of older peers, the version of the frame
+# format, a flags byte describing the payload and the payload length.
+FRAME_MAGIC = b'PD'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('!2sBBI')
+
+# Flags of the frame header.
+# FLAG_BATCH: the payload is a batch envelope carrying several
+# messages, each one preceded by its length (see pack_batch).
+FLAG_BATCH = 0x01
+# FLAG_SHM_OPEN: control frame of the shared memory handshake. Sent by
+# the sender with the name of its ring as payload, and answered by the
+# receiver with an empty payload once it is attached to the ring, or
+# with the reason why it could not attach.
+FLAG_SHM_OPEN = 0x02
+# FLAG_SHM_DOORBELL: control frame with empty payload, asking the
+# receiver to read its ring, or the sender to retry writing to it.
+FLAG_SHM_DOORBELL = 0x04
+# FLAG_HELLO: control frame that negotiates the features of the
+# connection. The side that opened the connection offers them and the
+# peer answers with the ones it accepts (see pack_hello).
+FLAG_HELLO = 0x08
+# FLAG_ACK: control frame with the number of messages, in the form
+# BATCH_ITEM_HEADER, that the receiver processed since its last
+# acknowledgement. Sent on connections that negotiated 'ack'.
+FLAG_ACK = 0x20
+CONTROL_FLAGS = FLAG_SHM_OPEN | FLAG_SHM_DOORBELL | FLAG_HELLO | FLAG_ACK
+# FLAG_COMPRESSED: the payload is compressed with the codec
+# negotiated for the connection.
+FLAG_COMPRESSED = 0x10
+
+BATCH_ITEM_HEADER = struct.Struct('!I')
+
+# Default limit of the payload of a single frame. Peers that announce
+# larger frames, or that send an unframed message larger than this,
+# are disconnected instead of being buffered.
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+def pack_frame_header(length, flags=0):
+    """Returns the header of a frame whose payload has
+    length bytes.
+
+    Parameters
+    ----------
+    length : int
+        size of the payload in bytes
+    flags : int, optional
+        flags describing the payload
+
+    Returns
+    -------
+    bytes
+        frame header
+    """
+    return FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, flags, length)
+
+
+def pack_batch(payloads):
+    """Builds the batch envelope that carries several
+    serialized messages in a single frame.
+
+    Parameters
+    ----------
+    payloads : list
+        serialized messages
+
+    Returns
+    -------
+    bytes
+        payload of a FLAG_BATCH frame
+    """
+    parts = list()
+    for payload in payloads:
+        parts.append(BATCH_ITEM_HEADER.pack(len(payload)))
+        parts.append(payload)
+    return b''.join(parts)
+
+
+def unpack_batch(envelope):
+    """Iterates over the serialized messages of a
+    batch envelope built by pack_batch.
+
+    Parameters
+    ----------
+    envelope : bytes-like
+        payload of a FLAG_BATCH frame
+    """
+    # the messages are memoryview slices of the envelope,
+    # so splitting a batch copies no data.
+    view = memoryview(envelope)
+    offset = 0
+    while offset < len(view):
+        length, = BATCH_ITEM_HEADER.unpack_from(view, offset)
+        offset += BATCH_ITEM_HEADER.size
+        yield view[offset:offset + length]
+        offset += length
+
+
+def pack_hello(features):
+    """Builds the payload of a FLAG_HELLO frame.
+
+    Parameters
+    ----------
+    features : dictionary
+        features of the connection, with keys: feature name and
+        values: list of the accepted values, in order of preference
+
+    Returns
+    -------
+    bytes
+        payload in the form b'name=value,value;name=value'
+    """
+    return ';'.join('{}={}'.format(name, ','.join(values))
+                    for name, values in features.items()).encode('ascii')
+
+
+def unpack_hello(payload):
+    """Reads the features of a FLAG_HELLO frame built
+    by pack_hello.
+
+    Parameters
+    ----------
+    payload : bytes-like
+        payload of the frame
+
+    Returns
+    -------
+    dictionary
+        features, with keys: feature name and values: list of values
+    """
+    features = dict()
+    for item in bytes(payload).decode('ascii', 'replace').split(';'):
+        name, _, values = item.partition('=')
+        if name:
+            features[name] = [value for value in values.split(',') if value]
+    return features
+
 
 class PeerProtocol(Protocol):
-    """docstring for PeerProtocol"""
+    """This class implements the wire protocol shared by the agents.
+
+    A connection carries either a sequence of frames (see
+    FRAME_HEADER), a single unframed pickled message ended by the
+    close of the connection, as sent by older PADE versions, or
+    Mosaik messages.
+
+    Outbound pooled connections are registered as streaming
+    producers of their transport, so they stop writing queued
+    messages while the transport buffer is full.
+
+    Frames larger than the compression threshold of the factory
+    are compressed once a codec is negotiated with the peer through
+    FLAG_HELLO.
+
+    When the factory asks for reliable delivery, the messages sent
+    through a pooled connection are kept in unacked until the peer
+    acknowledges them with FLAG_ACK, and at most max_unacked of the
+    factory are sent before the peer acknowledges some of them.
+
+    When the peer runs on the same host and accepts shared memory,
+    the messages go through a ShmRing and the connection carries only
+    the control frames of the ring (see FLAG_SHM_OPEN).
+    """
 
     message = None
     mosaik_msg_id = None
     await_gen = None
+    pool_key = None
+    framed = False
+    paused = False
+    last_used = 0.0
+    ring = None
+    ring_ready = False
+    codec = None
+    unacked = None
+    acking = False
+    acks = 0
 
     def __init__(self, fact):
         self.fact = fact
 
     def connectionMade(self):
-        peer = self.transport.getPeer()
-        sended_message = None
-
-        for message in self.fact.messages:
-            if int(message[0].port) == int(peer.port):
-                if str(message[0].host) == 'localhost' and str(peer.host) == '127.0.0.1' or \
-                   str(message[0].host) == str(peer.host):
-                    self.send_message(pickle.dumps(message[1]))
-                    sended_message = message
+        # outbound connections are handed to the connection pool,
+        # which sends them the messages waiting for this peer.
+        if self.pool_key is not None:
+            self.fact.pool.connection_made(self)
+
+    def send_pending(self):
+        """Sends the pending messages addressed to the peer of this
+        pooled connection, until there are no more messages or the
+        transport pauses the connection because its write buffer is
+        full. The remaining messages are sent on resumeProducing.
+        """
+        if self.ring is not None and self.ring.owner:
+            # messages wait for the receiver to accept the ring.
+            if self.ring_ready:
+                self._send_ring()
+            return
+        messages = self.fact.messages
+        key = self.pool_key
+        coalesce = self.fact.pool.coalesce_window is not None
+        while not self.paused and key in messages and not self._window_full():
+            if coalesce:
+                sent = self._send_batch()
+            else:
+                sent = (messages.popleft(key),)
+                self.send_frame(sent[0].payload)
+            for delivery in sent:
+                self._sent(delivery)
+
+    def _window_full(self):
+        # a reliable receiver that does not acknowledge the messages
+        # already sent gets no more of them.
+        return self.unacked is not None and len(self.unacked) >= self.fact.max_unacked
+
+    def _send_batch(self):
+        # coalesced messages are shipped as batch envelopes of
+        # at most coalesce_max_bytes each.
+        messages = self.fact.messages
+        max_bytes = self.fact.pool.coalesce_max_bytes
+        batch = [messages.popleft(self.pool_key)]
+        size = BATCH_ITEM_HEADER.size + len(batch[0].payload)
+        while (self.pool_key in messages and
+               size + len(messages.peek(self.pool_key).payload) <= max_bytes):
+            batch.append(messages.popleft(self.pool_key))
+            size += BATCH_ITEM_HEADER.size + len(batch[-1].payload)
+        if len(batch) == 1:
+            self.send_frame(batch[0].payload)
+        else:
+            self.send_frame(pack_batch([delivery.payload for delivery in batch]), FLAG_BATCH)
+        return batch
+
+    def _send_ring(self):
+        # messages are written to the ring until it is full, and a
+        # doorbell tells the receiver to read them. Messages larger
+        # than the ring go through the connection, after the doorbell
+        # of the messages queued before them.
+        messages = self.fact.messages
+        key = self.pool_key
+        ring = self.ring
+        written = False
+        while key in messages and not self._window_full():
+            payload = messages.peek(key).payload
+            if not ring.write(payload):
+                if ring.fits(len(payload)):
+                    ring.want_space()
+                    written = True
                     break
-        if sended_message is not None:
-            self.fact.messages.remove(sended_message)
+                if written:
+                    self.send_frame(b'', FLAG_SHM_DOORBELL)
+                    written = False
+                if self.paused:
+                    break
+                self.send_frame(payload)
+            else:
+                written = True
+                self.fact.stats['shm_sends'] += 1
+            self._sent(messages.popleft(key))
+        if written:
+            self.send_frame(b'', FLAG_SHM_DOORBELL)
+
+    def _sent(self, delivery):
+        if self.unacked is None:
+            delivery.done()
+        else:
+            delivery.attempts += 1
+            self.unacked.append(delivery)
+
+    def open_ring(self, size):
+        """Creates the shared memory ring used to send messages to
+        the peer of this pooled connection and announces it. The
+        messages wait until the peer answers, and go through the ring
+        if it accepts it or through the connection otherwise.
+
+        Parameters
+        ----------
+        size : int
+            size in bytes of the ring requested by the peer
+        """
+        try:
+            self.ring = ShmRing.create(size)
+        except (OSError, ValueError) as e:
+            print('[WARNING]: SHARED MEMORY DISABLED: {}'.format(e))
+            return
+        self.send_frame(self.ring.name.encode(), FLAG_SHM_OPEN)
+
+    def close_ring(self):
+        """Releases the shared memory ring of the connection."""
+        if self.ring is not None:
+            ring, self.ring = self.ring, None
+            self.ring_ready = False
+            ring.close()
+
+    def hello(self, features):
+        """Offers features to the peer of this pooled connection,
+        which are used once the peer accepts them.
+
+        Parameters
+        ----------
+        features : dictionary
+            features offered, with keys: feature name and values:
+            list of values, in order of preference
+        """
+        self.send_frame(pack_hello(features), FLAG_HELLO)
+
+    def control_received(self, payload, flags):
+        """Handles the control frames of the connection
+        negotiation and of the shared memory ring.
+
+        Parameters
+        ----------
+        payload : bytes-like
+            payload of the frame
+        flags : int
+            flags of the frame header
+        """
+        if flags & FLAG_HELLO:
+            features = unpack_hello(payload)
+            if self.pool_key is not None:
+                # answer of the peer with the features it accepts.
+                self.codec = compression.choose(features.get('compression', ()))
+                # the messages queued from now on are encoded in the
+                # format accepted by the peer.
+                formats = features.get('format', ())
+                self.fact.pool.formats[self.pool_key] = codec.FORMAT if codec.FORMAT in formats else None
+                if self.unacked is not None and 'ack' not in features:
+                    unacked, self.unacked = self.unacked, None
+                    for delivery in unacked:
+                        delivery.done()
+                return
+            accepted = dict()
+            self.codec = compression.choose(features.get('compression', ()))
+            if self.codec is not None:
+                accepted['compression'] = [self.codec]
+            if 'ack' in features:
+                self.acking = True
+                accepted['ack'] = ['1']
+            if codec.FORMAT in features.get('format', ()):
+                accepted['format'] = [codec.FORMAT]
+            self.send_frame(pack_hello(accepted), FLAG_HELLO)
+        elif flags & FLAG_ACK:
+            count, = BATCH_ITEM_HEADER.unpack_from(payload)
+            while count and self.unacked:
+                self.unacked.popleft().done()
+                count -= 1
+            # the acknowledged messages leave room for the queued ones
+            self.send_pending()
+        elif flags & FLAG_SHM_OPEN:
+            if self.ring is not None and self.ring.owner:
+                # answer of the receiver: an empty payload accepts the
+                # ring, otherwise the payload tells why it was refused.
+                if len(payload) == 0:
+                    self.ring_ready = True
+                else:
+                    print('[WARNING]: SHARED MEMORY REFUSED: {}'.format(bytes(payload).decode()))
+                    self.close_ring()
+                self.send_pending()
+                return
+            self.close_ring()
+            # only the agents that accept shared memory attach to a
+            # ring, and only when the sender runs on this host.
+            if self.fact.shm_ring_size is None:
+                self.send_frame(b'shared memory not accepted', FLAG_SHM_OPEN)
+                return
+            if not self.is_local():
+                self.send_frame(b'shared memory offered by a remote peer', FLAG_SHM_OPEN)
+                return
+            try:
+                self.ring = ShmRing.attach(bytes(payload).decode())
+            except (OSError, ValueError) as e:
+                self.send_frame(str(e).encode() or b'error', FLAG_SHM_OPEN)
+                return
+            self.send_frame(b'', FLAG_SHM_OPEN)
+        elif flags & FLAG_SHM_DOORBELL and self.ring is not None:
+            if self.ring.owner:
+                self.send_pending()
+                return
+            try:
+                for message, message_flags in self.ring.read():
+                    self.frame_received(message, message_flags)
+            except ValueError as e:
+                self._drop(str(e).upper())
+                return
+            if self.ring is not None and self.ring.take_want_space():
+                self.send_frame(b'', FLAG_SHM_DOORBELL)
+
+    def is_local(self):
+        """Returns True if the peer of the connection runs on this
+        host: it is connected through a Unix domain socket, a loopback
+        address or the address the connection was accepted on.
+        """
+        peer = self.transport.getPeer()
+        if isinstance(peer, UNIXAddress):
+            return True
+        host = getattr(peer, 'host', None)
+        if host is None:
+            return False
+        try:
+            if ipaddress.ip_address(host).is_loopback:
+                return True
+        except ValueError:
+            return False
+        return host == getattr(self.transport.getHost(), 'host', None)
+
+    def pauseProducing(self):
+        """Called by the transport when its write buffer is full."""
+        self.paused = True
+
+    def resumeProducing(self):
+        """Called by the transport when its write buffer was
+        flushed, sends the messages queued in the meantime.
+        """
+        self.paused = False
+        if self.pool_key is not None:
+            self.send_pending()
+
+    def stopProducing(self):
+        """Called by the transport when the connection is closed."""
+        self.paused = True
+
+    def close(self):
+        """Closes the connection once its write buffer is flushed."""
+        if self.pool_key is not None:
+            self.transport.unregisterProducer()
+        self.transport.loseConnection()
 
     def connectionLost(self, reason):
-        if self.message is not None:
+        if self.message is not None and not self.framed:
             try:
                 message = pickle.loads(self.message)
             except:
@@ -63,23 +476,48 @@ class PeerProtocol(Protocol):
             return message
 
     def dataReceived(self, data):
-        # receives part of the sent message.
+        # receives part of the sent message. The receive buffer is
+        # a bytearray, so appending data is amortized O(len(data)).
         if self.message is not None:
             self.message += data
         else:
-            self.message = data
+            self.message = bytearray(data)
+        # ------------------------------------
+        # framed agent messages
+        # ------------------------------------
+        if not self.framed:
+            if len(self.message) < len(FRAME_MAGIC):
+                return
+            self.framed = self.message.startswith(FRAME_MAGIC)
+        if self.framed:
+            self._read_frames()
+            if self.acks:
+                acks, self.acks = self.acks, 0
+                self.send_frame(BATCH_ITEM_HEADER.pack(acks), FLAG_ACK)
+            return
+        if self.fact.agent_ref is None:
+            # agent hosts carry only framed messages; Mosaik talks to
+            # the agents themselves.
+            self._drop('UNFRAMED DATA NOT ACCEPTED BY AGENT HOSTS')
+            return
+        # unframed data is buffered until the connection
+        # is closed, so it is bounded by the frame limit too.
+        max_size = self.fact.max_frame_size
+        if max_size is not None and len(self.message) > max_size:
+            self._drop('UNFRAMED MESSAGE LARGER THAN {} BYTES'.format(max_size))
+            return
         # ------------------------------------
         # make a verification if the message
         # is a MOSAIK message
         # ------------------------------------
         header = int.from_bytes(self.message[:4], byteorder='big')
-        if header == len(self.message[4:]):
+        if header == len(self.message) - 4:
             # get mosaik connection for assync
             if self.fact.agent_ref.mosaik_connection is None:
                 self.fact.agent_ref.mosaik_connection = self
 
             # Receive the generator returned by _process_message().
-            gen = self.fact.agent_ref.mosaik_sim._process_message(self.message,
+            gen = self.fact.agent_ref.mosaik_sim._process_message(bytes(self.message),
                                                                   self.mosaik_msg_id)
 
             # Advance the generator returned by _process_message().
@@ -119,18 +557,112 @@ class PeerProtocol(Protocol):
                     self.await_gen = gen
                     self.message = None
 
+    def _read_frames(self):
+        """Extracts every complete frame from the receive buffer
+        and hands its payload to frame_received.
+
+        A frame that ends the buffer is handed over as the buffer
+        itself, so large messages are not copied, and the other frames
+        are copied once into a bytearray, which the arrays of their
+        content are rebuilt on (see codec.decode). The consumed
+        frames are removed from the front of the buffer, which
+        bytearray does without moving the remaining data.
+        """
+        max_size = self.fact.max_frame_size
+        while self.message is not None and len(self.message) >= FRAME_HEADER.size:
+            buffer = self.message
+            magic, version, flags, length = FRAME_HEADER.unpack_from(buffer)
+            if magic != FRAME_MAGIC or version != FRAME_VERSION:
+                self._drop('INVALID FRAME HEADER')
+                return
+            if max_size is not None and length > max_size:
+                self._drop('FRAME OF {} BYTES EXCEEDS THE LIMIT OF {} BYTES'.format(length, max_size))
+                return
+            end = FRAME_HEADER.size + length
+            if len(buffer) < end:
+                return
+            if len(buffer) == end:
+                del buffer[:FRAME_HEADER.size]
+                payload = buffer
+                self.message = None
+            else:
+                with memoryview(buffer) as view:
+                    payload = bytearray(view[FRAME_HEADER.size:end])
+                del buffer[:end]
+            if flags & FLAG_COMPRESSED:
+                if self.codec is None:
+                    self._drop('COMPRESSED FRAME WITHOUT A NEGOTIATED CODEC')
+                    return
+                try:
+                    payload = compression.decompress(self.codec, payload, max_size)
+                except ValueError as e:
+                    self._drop(str(e).upper())
+                    return
+                flags &= ~FLAG_COMPRESSED
+            if flags & CONTROL_FLAGS:
+                self.control_received(payload, flags)
+            else:
+                self.frame_received(payload, flags)
+
+    def _drop(self, reason):
+        """Discards the receive buffer and closes a connection
+        whose peer does not follow the protocol.
+        """
+        peer = self.transport.getPeer()
+        if hasattr(peer, 'port'):
+            peer = '{}:{}'.format(peer.host, peer.port)
+        else:
+            peer = peer.name
+        print('[WARNING]: {} FROM {}, CLOSING CONNECTION.'.format(reason, peer))
+        self.message = None
+        self.framed = True
+        self.close()
+
+    def frame_received(self, payload, flags):
+        """Called for each complete frame received. Must be
+        overridden by the subclasses.
+
+        Parameters
+        ----------
+        payload : bytes-like
+            payload of the frame
+        flags : int
+            flags of the frame header
+        """
+        pass
+
+    def send_frame(self, payload, flags=0):
+        """Writes one framed message to the connection,
+        keeping the connection open. The payload is compressed
+        when a codec was negotiated and it is large enough.
+
+        Parameters
+        ----------
+        payload : bytes
+            serialized message
+        flags : int, optional
+            flags describing the payload
+        """
+        self.last_used = reactor.seconds()
+        if self.codec is not None and len(payload) >= self.fact.compression_threshold \
+                and not flags & CONTROL_FLAGS:
+            compressed = compression.compress(self.codec, payload)
+            if len(compressed) < len(payload):
+                stats = self.fact.stats
+                stats['compressed_frames'] += 1
+                stats['compression_bytes_before'] += len(payload)
+                stats['compression_bytes_after'] += len(compressed)
+                payload = compressed
+                flags |= FLAG_COMPRESSED
+        self.transport.writeSequence((pack_frame_header(len(payload), flags), payload))
+
     def got_mosaik_message(self, message):
         self.transport.write(message)
 
     def send_message(self, message):
-        l = len(message)
-        if l > 1024:
-
-            while len(message) > 0:
-                message, m = message[1024:], message[:1024]
-                self.transport.write(m)
-        else:
-            self.transport.write(message)
+        # the transport buffers the whole message and writes it as the
+        # socket accepts it, so it is handed over in a single call.
+        self.transport.write(message)
 
         try:
             peer = self.transport.getPeer()
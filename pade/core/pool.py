@@ -0,0 +1,1175 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Connection Pool Module
+----------------------
+
+This Python module keeps the long-lived outbound connections that
+an agent uses to deliver its ACL messages. Instead of opening a new
+TCP connection for every message, the AgentFactory asks the pool for
+an open connection to the receiver's (host, port) and writes the
+message to it, so the handshake is paid once per peer. The size of
+the queued messages is bounded by the watermarks of FlowControl.
+"""
+
+import random
+import socket
+from collections import Counter, deque
+
+from twisted.internet import defer, protocol, reactor
+
+from pade.core.shm import SHM
+
+
+# Host names that always refer to this machine. They are resolved
+# only once and cached, so 'localhost' and '127.0.0.1' share the
+# same pooled connections.
+LOCAL_HOSTS = ('localhost', 'localhost.localdomain')
+
+# Priority lanes of the messages. Messages of the PRIORITY lane, such
+# as system messages, are sent and processed before the ones of the
+# NORMAL lane. LANES gives the name of each lane, used in the metrics.
+PRIORITY = 0
+NORMAL = 1
+LANES = ('priority', 'normal')
+
+# Kind of the Unix domain socket endpoint published in the AID. The
+# destination key of a Unix socket connection is (UNIX, socket path).
+UNIX = 'unix'
+
+# Kind of the endpoint published in the AID by the agents that share
+# the listening port of an agent host. Its value is the name of the
+# host, which hands each message to all its receivers.
+HOSTED = 'host'
+
+
+class PendingLimitExceeded(Exception):
+    """The message did not fit in the outbound queue of the agent."""
+
+
+class Broadcast(object):
+    """Tracks the delivery of a message sent to several receivers
+    and reports how long it took to hand it to all of them.
+
+    Attributes
+    ----------
+    message : ACLMessage
+        message being delivered
+    receivers : int
+        number of receivers the message was queued or handed to
+    remaining : int
+        number of receivers still waiting for the message
+    started : float
+        reactor time when the message was sent
+    sealed : bool
+        True once all the receivers have been queued
+    on_done : method
+        called with the Broadcast and the completion time in seconds
+    """
+
+    __slots__ = ('message', 'receivers', 'remaining', 'started', 'sealed', 'on_done')
+
+    def __init__(self, message, on_done):
+        self.message = message
+        self.receivers = 0
+        self.remaining = 0
+        self.started = reactor.seconds()
+        self.sealed = False
+        self.on_done = on_done
+
+    def add(self):
+        """Accounts for one more receiver."""
+        self.receivers += 1
+        self.remaining += 1
+
+    def delivered(self):
+        """Accounts for one more receiver that got the message at
+        once, without going through the connections."""
+        self.receivers += 1
+
+    def done(self):
+        """Accounts for one receiver that got the message."""
+        self.remaining -= 1
+        self._check()
+
+    def seal(self):
+        """Marks that no more receivers will be added."""
+        self.sealed = True
+        self._check()
+
+    def _check(self):
+        if self.sealed and self.remaining == 0 and self.on_done is not None:
+            on_done, self.on_done = self.on_done, None
+            on_done(self, reactor.seconds() - self.started)
+
+
+class Delivery(object):
+    """A message waiting to be sent to one receiver.
+
+    Attributes
+    ----------
+    receiver : AID
+        registered AID of the receiver
+    message : ACLMessage
+        message to be sent
+    payload : bytes
+        serialized message, shared by all the receivers
+    broadcast : Broadcast
+        delivery tracker of the message, when it has several receivers
+    attempts : int
+        number of times the message was sent without being
+        acknowledged by the receiver
+    deadline : float
+        reactor time after which the message expires, or None
+    lane : int
+        priority lane of the message, PRIORITY or NORMAL
+    """
+
+    __slots__ = ('receiver', 'message', 'payload', 'broadcast', 'attempts', 'deadline', 'lane')
+
+    def __init__(self, receiver, message, payload, broadcast=None, deadline=None, lane=NORMAL):
+        self.receiver = receiver
+        self.message = message
+        self.payload = payload
+        self.broadcast = broadcast
+        self.attempts = 0
+        self.deadline = deadline
+        self.lane = lane
+
+    def done(self):
+        """Called once the message was handed to the connection."""
+        if self.broadcast is not None:
+            self.broadcast.done()
+
+
+class LaneQueue(object):
+    """Messages waiting to be sent to one destination, in one FIFO
+    deque per priority lane. Messages of the PRIORITY lane are taken
+    before the ones of the NORMAL lane.
+
+    Attributes
+    ----------
+    lanes : tuple
+        deques of Delivery entries, indexed by lane
+    """
+
+    __slots__ = ('lanes',)
+
+    def __init__(self, entries=()):
+        self.lanes = tuple(deque() for name in LANES)
+        for entry in entries:
+            self.append(entry)
+
+    def __len__(self):
+        return sum(len(lane) for lane in self.lanes)
+
+    def __iter__(self):
+        for lane in self.lanes:
+            for entry in lane:
+                yield entry
+
+    def append(self, entry):
+        """Appends a message to the end of its lane."""
+        self.lanes[entry.lane].append(entry)
+
+    def appendleft(self, entry):
+        """Puts a message at the front of its lane."""
+        self.lanes[entry.lane].appendleft(entry)
+
+    def peek(self):
+        """Returns the next message to be sent."""
+        for lane in self.lanes:
+            if lane:
+                return lane[0]
+        raise IndexError('peek from an empty queue')
+
+    def popleft(self):
+        """Removes and returns the next message to be sent."""
+        for lane in self.lanes:
+            if lane:
+                return lane.popleft()
+        raise IndexError('pop from an empty queue')
+
+
+class MessageQueue(dict):
+    """Messages waiting to be sent, indexed by destination.
+
+    Keys are the normalized (host, port) of the receivers, as
+    returned by ConnectionPool.key, and values are LaneQueue objects
+    holding FIFO deques of Delivery entries per priority lane, so
+    enqueuing a message and taking the messages of a destination
+    are O(1).
+
+    The size of the queued messages is reported to the FlowControl
+    given, if any, as they are queued and removed.
+
+    Attributes
+    ----------
+    flow : FlowControl
+        flow control of the outbound messages, or None
+    """
+
+    def __init__(self, flow=None):
+        """Init the MessageQueue class
+
+        Parameters
+        ----------
+        flow : FlowControl, optional
+            flow control of the outbound messages
+        """
+        super(MessageQueue, self).__init__()
+        self.flow = flow
+
+    def push(self, key, entry):
+        """Appends a message to the queue of a destination.
+
+        Parameters
+        ----------
+        key : tuple
+            destination, in the form (host, port)
+        entry : Delivery
+            message waiting to be sent
+        """
+        try:
+            self[key].append(entry)
+        except KeyError:
+            self[key] = LaneQueue((entry,))
+        if self.flow is not None:
+            self.flow.add(key, len(entry.payload))
+
+    def peek(self, key):
+        """Returns the next message to be sent to a destination,
+        without removing it.
+
+        Parameters
+        ----------
+        key : tuple
+            destination, in the form (host, port)
+
+        Returns
+        -------
+        Delivery
+            queued entry
+        """
+        return self[key].peek()
+
+    def popleft(self, key):
+        """Removes and returns the next message to be sent to a
+        destination: the oldest one of its highest priority lane.
+
+        Parameters
+        ----------
+        key : tuple
+            destination, in the form (host, port)
+
+        Returns
+        -------
+        Delivery
+            queued entry
+        """
+        queue = self[key]
+        entry = queue.popleft()
+        if not queue:
+            del self[key]
+        if self.flow is not None:
+            self.flow.remove(key, len(entry.payload))
+        return entry
+
+    def retract(self, key, entry):
+        """Removes a message that was just queued to a destination.
+
+        Parameters
+        ----------
+        key : tuple
+            destination, in the form (host, port)
+        entry : Delivery
+            newest entry of its lane
+
+        Returns
+        -------
+        Delivery
+            queued entry
+        """
+        queue = self[key]
+        queue.lanes[entry.lane].remove(entry)
+        if not queue:
+            del self[key]
+        if self.flow is not None:
+            self.flow.remove(key, len(entry.payload))
+        return entry
+
+    def requeue(self, key, entries):
+        """Puts messages back at the front of the queue of a
+        destination, keeping their order.
+
+        Parameters
+        ----------
+        key : tuple
+            destination, in the form (host, port)
+        entries : list
+            messages to be sent again
+        """
+        if not entries:
+            return
+        queue = self.setdefault(key, LaneQueue())
+        for entry in reversed(entries):
+            queue.appendleft(entry)
+        if self.flow is not None:
+            self.flow.add(key, sum(len(entry.payload) for entry in entries))
+
+    def drain(self, key):
+        """Removes and returns all the messages waiting
+        for a destination, in the order they would be sent.
+
+        Parameters
+        ----------
+        key : tuple
+            destination, in the form (host, port)
+
+        Returns
+        -------
+        LaneQueue
+            queued entries
+        """
+        queue = self.pop(key, LaneQueue())
+        if self.flow is not None and queue:
+            self.flow.remove(key, sum(len(entry.payload) for entry in queue))
+        return queue
+
+    def expire(self, now):
+        """Removes the messages whose deadline has passed.
+
+        Parameters
+        ----------
+        now : float
+            current reactor time
+
+        Returns
+        -------
+        tuple
+            (expired, next_deadline): the list of the removed entries,
+            in the form (key, Delivery), and the earliest deadline of
+            the remaining messages, or None
+        """
+        expired = list()
+        next_deadline = None
+        for key, queue in list(self.items()):
+            kept = LaneQueue()
+            size = 0
+            for entry in queue:
+                if entry.deadline is None:
+                    kept.append(entry)
+                elif entry.deadline <= now:
+                    expired.append((key, entry))
+                    size += len(entry.payload)
+                else:
+                    kept.append(entry)
+                    if next_deadline is None or entry.deadline < next_deadline:
+                        next_deadline = entry.deadline
+            if not size and len(kept) == len(queue):
+                continue
+            if kept:
+                self[key] = kept
+            else:
+                del self[key]
+            if self.flow is not None:
+                self.flow.remove(key, size)
+        return expired, next_deadline
+
+    def depth(self, key):
+        """Returns the number of messages waiting for
+        a destination.
+        """
+        queue = self.get(key)
+        return len(queue) if queue is not None else 0
+
+    def depths(self):
+        """Returns the number of messages waiting for each
+        destination, in the form {(host, port): depth}.
+        """
+        return dict((key, len(queue)) for key, queue in self.items())
+
+    def lane_depths(self):
+        """Returns the number of messages waiting in each priority
+        lane, in the form {lane name: depth}.
+        """
+        return dict((name, sum(len(queue.lanes[lane]) for queue in self.values()))
+                    for lane, name in enumerate(LANES))
+
+    def total(self):
+        """Returns the number of messages waiting for
+        all destinations.
+        """
+        return sum(len(queue) for queue in self.values())
+
+
+class FlowControl(object):
+    """Outbound flow control of an agent.
+
+    Tracks the size of the messages queued and not yet written to
+    a connection, in total and per destination. When the total
+    reaches high_watermark the agent is paused: the registered
+    producers are paused and sends are reported as throttled until
+    the total falls back to low_watermark. A destination whose
+    queued bytes reach peer_high_watermark is blocked the same way
+    until they fall to peer_low_watermark. A watermark of None
+    disables the corresponding limit.
+
+    Messages sent while paused or blocked are still queued, so the
+    limits take effect when the senders wait for capacity through
+    wait or by registering as producers. Only max_pending is a hard
+    limit: messages that would take the total above it are refused.
+
+    Attributes
+    ----------
+    high_watermark : int
+        total queued bytes that pause the agent
+    low_watermark : int
+        total queued bytes that resume the agent
+    peer_high_watermark : int
+        queued bytes of a destination that block it
+    peer_low_watermark : int
+        queued bytes of a destination that unblock it
+    max_pending : int
+        largest total of queued bytes, or None
+    pending : int
+        total queued bytes
+    peer_pending : dictionary
+        queued bytes per destination
+    paused : bool
+        True while the total is above the watermarks
+    blocked : set
+        destinations above their watermarks
+    throttled : Counter
+        number of messages sent to each destination
+        while it was blocked or the agent was paused
+    producers : list
+        registered IPushProducer objects
+    waiters : list
+        pending wait calls, in the form (destination, Deferred)
+    """
+
+    def __init__(self, high_watermark=None, low_watermark=None,
+                 peer_high_watermark=None, peer_low_watermark=None, max_pending=None):
+        """Init the FlowControl class
+
+        Parameters
+        ----------
+        high_watermark : int, optional
+            total queued bytes that pause the agent
+        low_watermark : int, optional
+            total queued bytes that resume the agent
+        peer_high_watermark : int, optional
+            queued bytes of a destination that block it
+        peer_low_watermark : int, optional
+            queued bytes of a destination that unblock it
+        max_pending : int, optional
+            largest total of queued bytes
+        """
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark if low_watermark is not None else high_watermark
+        self.peer_high_watermark = peer_high_watermark
+        self.peer_low_watermark = peer_low_watermark if peer_low_watermark is not None \
+            else peer_high_watermark
+        self.max_pending = max_pending
+        self.pending = 0
+        self.peer_pending = dict()
+        self.paused = False
+        self.blocked = set()
+        self.throttled = Counter()
+        self.producers = list()
+        self.waiters = list()
+
+    def add(self, key, size):
+        """Accounts for a message queued to a destination.
+
+        Parameters
+        ----------
+        key : tuple
+            destination of the message
+        size : int
+            size of the message in bytes
+        """
+        self.pending += size
+        pending = self.peer_pending.get(key, 0) + size
+        self.peer_pending[key] = pending
+        if self.peer_high_watermark is not None and pending >= self.peer_high_watermark:
+            self.blocked.add(key)
+        if self.high_watermark is not None and not self.paused and \
+                self.pending >= self.high_watermark:
+            self.paused = True
+            for producer in list(self.producers):
+                producer.pauseProducing()
+
+    def remove(self, key, size):
+        """Accounts for messages of a destination that left the queue,
+        resuming the producers and firing the waiters when capacity
+        returns.
+
+        Parameters
+        ----------
+        key : tuple
+            destination of the messages
+        size : int
+            size of the messages in bytes
+        """
+        self.pending -= size
+        pending = self.peer_pending.get(key, 0) - size
+        if pending > 0:
+            self.peer_pending[key] = pending
+        else:
+            self.peer_pending.pop(key, None)
+        if key in self.blocked and pending <= self.peer_low_watermark:
+            self.blocked.discard(key)
+        if self.paused and self.pending <= self.low_watermark:
+            self.paused = False
+            for producer in list(self.producers):
+                producer.resumeProducing()
+        if self.waiters:
+            self._notify()
+
+    def admits(self, size):
+        """Returns True if a message of size bytes can be queued
+        without exceeding max_pending.
+        """
+        return self.max_pending is None or self.pending + size <= self.max_pending
+
+    def would_block(self, key=None):
+        """Returns True if a message sent now to the destination,
+        or to any destination if key is None, would be throttled.
+
+        Parameters
+        ----------
+        key : tuple, optional
+            destination of the message
+        """
+        return self.paused or key in self.blocked
+
+    def throttle(self, key):
+        """Accounts for a message sent to a destination while
+        it would block and returns True, or returns False.
+
+        Parameters
+        ----------
+        key : tuple
+            destination of the message
+        """
+        if not self.would_block(key):
+            return False
+        self.throttled[key] += 1
+        return True
+
+    def wait(self, key=None):
+        """Returns a Deferred that fires with None once a message
+        can be sent to the destination, or to any destination if key
+        is None, without being throttled.
+
+        Parameters
+        ----------
+        key : tuple, optional
+            destination of the message
+
+        Returns
+        -------
+        Deferred
+            fired when capacity returns
+        """
+        if not self.would_block(key):
+            return defer.succeed(None)
+        d = defer.Deferred()
+        self.waiters.append((key, d))
+        return d
+
+    def registerProducer(self, producer):
+        """Registers an IPushProducer that is paused while the
+        agent is paused and resumed when capacity returns.
+
+        Parameters
+        ----------
+        producer : IPushProducer
+            producer of outbound messages
+        """
+        self.producers.append(producer)
+        if self.paused:
+            producer.pauseProducing()
+
+    def unregisterProducer(self, producer):
+        """Removes a producer registered with registerProducer.
+
+        Parameters
+        ----------
+        producer : IPushProducer
+            producer of outbound messages
+        """
+        if producer in self.producers:
+            self.producers.remove(producer)
+
+    def _notify(self):
+        ready = [d for key, d in self.waiters if not self.would_block(key)]
+        if not ready:
+            return
+        self.waiters = [(key, d) for key, d in self.waiters if self.would_block(key)]
+        for d in ready:
+            d.callback(None)
+
+
+class PoolClientFactory(protocol.ClientFactory):
+    """Client factory used by the ConnectionPool to open one
+    outbound connection to a given destination.
+
+    Attributes
+    ----------
+    pool : ConnectionPool
+        pool that requested the connection
+    key : tuple
+        destination of the connection, in the form (host, port)
+    """
+
+    def __init__(self, pool, key):
+        """Init the PoolClientFactory class
+
+        Parameters
+        ----------
+        pool : ConnectionPool
+            pool that requested the connection
+        key : tuple
+            destination of the connection, in the form (host, port)
+        """
+        self.pool = pool
+        self.key = key
+
+    def buildProtocol(self, addr):
+        """Builds the agent protocol of the AgentFactory and marks
+        it as an outbound pooled connection.
+
+        Parameters
+        ----------
+        addr : IAddress
+            address of the remote peer
+
+        Returns
+        -------
+        AgentProtocol
+            return a protocol instance
+        """
+        p = self.pool.fact.buildProtocol(addr)
+        p.pool_key = self.key
+        return p
+
+    def clientConnectionFailed(self, connector, reason):
+        """Releases the connection slot and forwards the failure
+        to the AgentFactory.
+
+        Parameters
+        ----------
+        connector : IConnector
+            connector used in the connection attempt
+        reason : twisted failure
+            Identifies the problem in the connection attempt.
+        """
+        self.pool.connection_failed(self.key, reason)
+        self.pool.fact.clientConnectionFailed(connector, reason)
+
+    def clientConnectionLost(self, connector, reason):
+        """Forwards the lost connection to the AgentFactory.
+
+        Parameters
+        ----------
+        connector : IConnector
+            connector used in the connection
+        reason : twisted failure
+            Identifies the problem in the lost connection.
+        """
+        self.pool.fact.clientConnectionLost(connector, reason)
+
+
+class ConnectionPool(object):
+    """This class keeps the outbound connections of an agent
+    open and reuses them across messages.
+
+    Connections are indexed by the normalized (host, port) of
+    the receiver. Receivers that run on the same host and publish a
+    Unix domain socket endpoint are reached through it instead, with
+    the key (UNIX, socket path). At most max_per_peer connections are opened to
+    the same destination and connections that stay idle for more
+    than idle_timeout seconds are closed.
+
+    At most max_in_flight connection attempts run at the same time,
+    whatever their destination. Destinations that need a connection
+    while this limit is reached wait in line and are connected as
+    soon as earlier attempts complete or fail.
+
+    A destination that cannot be connected is retried after a delay
+    that starts at retry_initial_delay and doubles after each failure,
+    up to retry_max_delay, with a random jitter of +/- 50%. After
+    retry_max_attempts failed attempts in a row, its queued messages
+    are reported to AgentFactory.delivery_failed.
+
+    When coalesce_window is not None, the messages addressed to a
+    destination are held for coalesce_window seconds (0 means until
+    the end of the current reactor iteration) and then shipped
+    together in batch envelopes of at most coalesce_max_bytes.
+
+    Attributes
+    ----------
+    fact : AgentFactory
+        factory that owns the pool
+    max_per_peer : int
+        maximum number of connections to the same destination
+    idle_timeout : float
+        time in seconds after which an idle connection is closed
+    max_in_flight : int
+        maximum number of simultaneous connection attempts
+    in_flight : int
+        number of connection attempts in progress
+    waiting : deque
+        destinations waiting for a connection attempt slot
+    waiting_keys : set
+        the destinations of waiting, to find them in constant time
+    coalesce_window : float
+        time in seconds during which messages to the same destination
+        are buffered, or None to send each message at once
+    coalesce_max_bytes : int
+        maximum size of a batch envelope
+    retry_max_attempts : int
+        failed connection attempts in a row after which the messages
+        of a destination fail, None to retry forever
+    retry_initial_delay : float
+        delay in seconds before the first retry
+    retry_max_delay : float
+        longest delay in seconds between retries
+    attempts : dictionary
+        number of failed connection attempts in a row per destination
+    drops : dictionary
+        number of connections lost in a row per destination while
+        messages were still waiting for it
+    retries : dictionary
+        scheduled connection retries per destination
+    flushes : dictionary
+        scheduled flushes of the coalesced messages per destination
+    connections : dictionary
+        open connections, a dictionary with keys: (host, port) and
+        values: list of AgentProtocol
+    connecting : dictionary
+        number of connection attempts in progress per destination
+    addresses : dictionary
+        cache of resolved local host names
+    local_addresses : set
+        addresses of this host, whose agents are reached through
+        their Unix domain sockets
+    unavailable : set
+        Unix socket paths that could not be connected, whose agents
+        are reached through TCP
+    ring_sizes : dictionary
+        size of the shared memory ring of the destinations whose
+        agents run on this host and accept shared memory
+    formats : dictionary
+        wire format of the messages accepted by each destination, as
+        negotiated on its last connection: codec.FORMAT, or None
+        when it only reads pickled messages
+    """
+
+    def __init__(self, fact, max_per_peer=1, idle_timeout=30.0, max_in_flight=64,
+                 coalesce_window=None, coalesce_max_bytes=65536,
+                 retry_max_attempts=5, retry_initial_delay=0.5, retry_max_delay=30.0):
+        """Init the ConnectionPool class
+
+        Parameters
+        ----------
+        fact : AgentFactory
+            factory that owns the pool
+        max_per_peer : int, optional
+            maximum number of connections to the same destination
+        idle_timeout : float, optional
+            time in seconds after which an idle connection is closed
+        max_in_flight : int, optional
+            maximum number of simultaneous connection attempts
+        coalesce_window : float, optional
+            time in seconds during which messages to the same
+            destination are buffered, None disables coalescing
+        coalesce_max_bytes : int, optional
+            maximum size of a batch envelope
+        retry_max_attempts : int, optional
+            failed connection attempts in a row after which the
+            messages of a destination fail, None to retry forever
+        retry_initial_delay : float, optional
+            delay in seconds before the first retry
+        retry_max_delay : float, optional
+            longest delay in seconds between retries
+        """
+        self.fact = fact
+        self.max_per_peer = max_per_peer
+        self.idle_timeout = idle_timeout
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.waiting = deque()
+        self.waiting_keys = set()
+        self.coalesce_window = coalesce_window
+        self.coalesce_max_bytes = coalesce_max_bytes
+        self.retry_max_attempts = retry_max_attempts
+        self.retry_initial_delay = retry_initial_delay
+        self.retry_max_delay = retry_max_delay
+        self.attempts = dict()
+        self.drops = dict()
+        self.retries = dict()
+        self.flushes = dict()
+        self.connections = dict()
+        self.connecting = dict()
+        self.addresses = dict()
+        self.local_addresses = set(['127.0.0.1', '::1'])
+        self.local_addresses.add(self.resolve(fact.aid.host))
+        self.unavailable = set()
+        self.ring_sizes = dict()
+        self.formats = dict()
+        self.sweeper = None
+
+    def resolve(self, host):
+        """Returns the address used to connect to host. Local
+        host names are resolved once and cached.
+
+        Parameters
+        ----------
+        host : str
+            host name or IP address
+
+        Returns
+        -------
+        str
+            resolved address
+        """
+        host = str(host)
+        try:
+            return self.addresses[host]
+        except KeyError:
+            pass
+        if host in LOCAL_HOSTS:
+            try:
+                address = socket.gethostbyname(host)
+            except socket.error:
+                address = '127.0.0.1'
+        else:
+            address = host
+        self.addresses[host] = address
+        return address
+
+    def key(self, host, port):
+        """Returns the normalized key of a destination.
+
+        Parameters
+        ----------
+        host : str
+            host name or IP address
+        port : int
+            TCP port
+
+        Returns
+        -------
+        tuple
+            (address, port)
+        """
+        return (self.resolve(host), int(port))
+
+    def route(self, aid):
+        """Returns the key of the destination used to reach an agent:
+        its Unix domain socket when it runs on this host and publishes
+        one, or its TCP address otherwise.
+
+        Parameters
+        ----------
+        aid : AID
+            registered AID of the receiver
+
+        Returns
+        -------
+        tuple
+            destination key
+        """
+        local = self.resolve(aid.host) in self.local_addresses
+        path = aid.getEndpoint(UNIX)
+        if path is not None and path not in self.unavailable and local:
+            key = (UNIX, path)
+        else:
+            key = self.key(aid.host, aid.port)
+        ring_size = aid.getEndpoint(SHM)
+        if ring_size is not None and local:
+            self.ring_sizes[key] = ring_size
+        return key
+
+    def get(self, key):
+        """Returns an open connection to the destination, or None
+        if there is no open connection. When more than one is open,
+        the least recently used one whose transport is not paused
+        is returned.
+
+        Parameters
+        ----------
+        key : tuple
+            destination, in the form (host, port)
+        """
+        conns = self.connections.get(key)
+        if not conns:
+            return None
+        return min(conns, key=lambda c: (c.paused, c.last_used))
+
+    def deliver(self, key, urgent=False):
+        """Delivers the pending messages of a destination, using an
+        open connection when there is one or opening a new connection
+        otherwise.
+
+        Parameters
+        ----------
+        key : tuple
+            destination, in the form (host, port)
+        urgent : bool, optional
+            whether a message of the PRIORITY lane is waiting, in
+            which case the messages are sent without waiting for the
+            coalescing window
+        """
+        conn = self.get(key)
+        if conn is None:
+            self.connect(key)
+        elif self.coalesce_window is None:
+            conn.send_pending()
+        elif urgent:
+            flush = self.flushes.pop(key, None)
+            if flush is not None:
+                flush.cancel()
+            conn.send_pending()
+        elif key not in self.flushes:
+            self.flushes[key] = reactor.callLater(self.coalesce_window,
+                                                  self._flush, key)
+
+    def _flush(self, key):
+        """Sends the messages coalesced for a destination."""
+        del self.flushes[key]
+        conn = self.get(key)
+        if conn is not None:
+            conn.send_pending()
+        else:
+            self.connect(key)
+
+    def connect(self, key):
+        """Opens a new connection to the destination, unless the
+        per-peer connection cap has been reached or a retry is
+        scheduled for the destination. If max_in_flight
+        connection attempts are already running, the destination
+        waits for a free slot.
+
+        Parameters
+        ----------
+        key : tuple
+            destination, in the form (host, port)
+        """
+        opened = len(self.connections.get(key, ())) + self.connecting.get(key, 0)
+        if opened >= self.max_per_peer or key in self.retries:
+            return
+        if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+            if key not in self.waiting_keys:
+                self.waiting_keys.add(key)
+                self.waiting.append(key)
+            return
+        self.connecting[key] = self.connecting.get(key, 0) + 1
+        self.in_flight += 1
+        if key[0] == UNIX:
+            reactor.connectUNIX(key[1], PoolClientFactory(self, key))
+        else:
+            reactor.connectTCP(key[0], key[1], PoolClientFactory(self, key))
+        self._schedule_sweep()
+
+    def connection_made(self, conn):
+        """Registers a new outbound connection and sends it the
+        messages that are waiting for its destination.
+
+        Parameters
+        ----------
+        conn : AgentProtocol
+            protocol of the connection
+        """
+        key = conn.pool_key
+        self._release_slot(key)
+        self.attempts.pop(key, None)
+        conn.last_used = reactor.seconds()
+        self.connections.setdefault(key, list()).append(conn)
+        # the connection stops taking queued messages while
+        # the write buffer of its transport is full.
+        conn.transport.registerProducer(conn, True)
+        features = dict()
+        # compression is offered to the agents of other hosts only.
+        if self.fact.compression is not None and key[0] != UNIX and \
+                key[0] not in self.local_addresses:
+            features['compression'] = [self.fact.compression]
+        if self.fact.reliable:
+            features['ack'] = ['1']
+            conn.unacked = deque()
+        if self.fact.wire_format is not None:
+            features['format'] = [self.fact.wire_format]
+        if features:
+            conn.hello(features)
+        ring_size = self.ring_sizes.get(key)
+        if ring_size is not None:
+            conn.open_ring(ring_size)
+        conn.send_pending()
+
+    def connection_lost(self, conn, reason=None):
+        """Removes a closed connection from the pool. The messages
+        sent through it and not acknowledged by the receiver are
+        queued again, or fail after retry_max_attempts sends. If
+        there are still messages waiting for that destination, a new
+        connection is opened, with the backoff of connection_failed
+        when no other connection to it is left, so that a peer that
+        drops every connection is not reconnected in a tight loop.
+
+        Parameters
+        ----------
+        conn : AgentProtocol
+            protocol of the connection
+        reason : twisted failure, optional
+            Identifies the problem in the lost connection.
+        """
+        key = conn.pool_key
+        conns = self.connections.get(key)
+        if conns is not None and conn in conns:
+            conns.remove(conn)
+            if not conns:
+                del self.connections[key]
+        if conn.unacked:
+            unacked, conn.unacked = conn.unacked, None
+            retry = list()
+            for delivery in unacked:
+                if self.retry_max_attempts is not None and \
+                        delivery.attempts >= self.retry_max_attempts:
+                    self.fact.delivery_failed(delivery, reason)
+                else:
+                    retry.append(delivery)
+            self.fact.messages.requeue(key, retry)
+        if not self.fact.messages.depth(key):
+            self.drops.pop(key, None)
+        elif key in self.connections:
+            self.connect(key)
+        elif key not in self.retries:
+            drops = self.drops[key] = self.drops.get(key, 0) + 1
+            self._schedule_retry(key, drops)
+
+    def connection_failed(self, key, reason):
+        """Releases the slot of a connection attempt that failed.
+        When a Unix domain socket cannot be connected, its messages
+        are sent through TCP instead. Otherwise the connection is
+        retried with exponential backoff, and the messages fail after
+        retry_max_attempts attempts.
+
+        Parameters
+        ----------
+        key : tuple
+            destination, in the form (host, port)
+        reason : twisted failure
+            Identifies the problem in the connection attempt.
+        """
+        self._release_slot(key)
+        if key[0] == UNIX:
+            self.unavailable.add(key[1])
+            for delivery in self.fact.messages.drain(key):
+                tcp_key = self.key(delivery.receiver.host, delivery.receiver.port)
+                self.fact.messages.push(tcp_key, delivery)
+                self.deliver(tcp_key)
+            return
+        if not self.fact.messages.depth(key) or key in self.retries:
+            return
+        attempts = self.attempts.get(key, 0) + 1
+        if self.retry_max_attempts is not None and attempts >= self.retry_max_attempts:
+            self.attempts.pop(key, None)
+            for delivery in self.fact.messages.drain(key):
+                self.fact.delivery_failed(delivery, reason)
+            return
+        self.attempts[key] = attempts
+        self._schedule_retry(key, attempts)
+
+    def _schedule_retry(self, key, attempts):
+        # exponential backoff with a random jitter of +/- 50%
+        delay = min(self.retry_max_delay, self.retry_initial_delay * 2 ** (attempts - 1))
+        delay *= random.uniform(0.5, 1.5)
+        self.retries[key] = reactor.callLater(delay, self._retry, key)
+
+    def _retry(self, key):
+        del self.retries[key]
+        if self.fact.messages.depth(key):
+            self.connect(key)
+
+    def close(self):
+        """Closes all the pooled connections."""
+        if self.sweeper is not None and self.sweeper.active():
+            self.sweeper.cancel()
+        self.sweeper = None
+        for flush in self.flushes.values():
+            if flush.active():
+                flush.cancel()
+        self.flushes = dict()
+        for retry in self.retries.values():
+            if retry.active():
+                retry.cancel()
+        self.retries = dict()
+        self.drops = dict()
+        self.waiting.clear()
+        self.waiting_keys.clear()
+        for conns in list(self.connections.values()):
+            for conn in list(conns):
+                conn.close()
+        self.connections = dict()
+
+    def _release_slot(self, key):
+        count = self.connecting.get(key, 0) - 1
+        if count > 0:
+            self.connecting[key] = count
+        else:
+            self.connecting.pop(key, None)
+        self.in_flight -= 1
+        # the freed slot goes to the next destination in line
+        # that still has messages to deliver.
+        while self.waiting and (self.max_in_flight is None or
+                                self.in_flight < self.max_in_flight):
+            key = self.waiting.popleft()
+            self.waiting_keys.discard(key)
+            if self.fact.messages.depth(key):
+                self.deliver(key)
+
+    def _schedule_sweep(self):
+        if self.idle_timeout is None:
+            return
+        if self.sweeper is None or not self.sweeper.active():
+            self.sweeper = reactor.callLater(self.idle_timeout, self._sweep)
+
+    def _sweep(self):
+        """Closes the connections that stayed idle for longer than
+        idle_timeout seconds.
+        """
+        self.sweeper = None
+        now = reactor.seconds()
+        for key, conns in list(self.connections.items()):
+            for conn in list(conns):
+                if now - conn.last_used >= self.idle_timeout:
+                    conns.remove(conn)
+                    conn.close()
+            if not conns:
+                del self.connections[key]
+        if self.connections or self.connecting:
+            self._schedule_sweep()
@@ -0,0 +1,245 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+
+Shared Memory Module
+--------------------
+
+This Python module implements the shared memory ring buffers used
+by agent processes of the same host to exchange framed messages
+without copying them through the kernel network stack.
+
+A sender creates one ring per receiver and announces it on the
+pooled connection to that receiver, which then carries only
+doorbell frames: the sender writes messages to the ring and sends a
+doorbell so that the receiver reads them, and the receiver sends a
+doorbell back when the sender waits for free space in the ring.
+"""
+
+import struct
+from multiprocessing import resource_tracker, shared_memory
+
+
+# Kind of the endpoint published in the AID by the agents that accept
+# messages through shared memory. Its value is the size in bytes of
+# the ring the senders must create.
+SHM = 'shm'
+
+# The ring header keeps each counter in its own cache line. head and
+# tail are the total number of bytes written and read, so the ring
+# is empty when they are equal. head is only written by the sender and
+# tail only by the receiver.
+COUNTER = struct.Struct('Q')
+CAPACITY_OFFSET = 0
+HEAD_OFFSET = 64
+TAIL_OFFSET = 128
+WANT_SPACE_OFFSET = 192
+DATA_OFFSET = 256
+
+# Each message in the ring is preceded by its length and frame flags.
+RECORD_HEADER = struct.Struct('!IB')
+
+# names of the blocks created by this process, which stay registered
+# in its resource tracker when they are attached in this process too.
+created = set()
+
+
+class ShmRing(object):
+    """Single producer, single consumer ring buffer of framed
+    messages in a shared memory block.
+
+    Attributes
+    ----------
+    shm : SharedMemory
+        shared memory block of the ring
+    owner : bool
+        True in the sender, which created the block and unlinks it
+    capacity : int
+        size of the data area in bytes
+    """
+
+    def __init__(self, shm, owner):
+        """Init the ShmRing class. Use create or attach instead.
+
+        Parameters
+        ----------
+        shm : SharedMemory
+            shared memory block of the ring
+        owner : bool
+            True if the block was created by this process
+        """
+        self.shm = shm
+        self.owner = owner
+        self.capacity = self._get(CAPACITY_OFFSET)
+
+    @classmethod
+    def create(cls, size):
+        """Creates a new ring with a data area of size bytes.
+
+        Parameters
+        ----------
+        size : int
+            size of the data area in bytes
+
+        Returns
+        -------
+        ShmRing
+            ring owned by this process
+        """
+        shm = shared_memory.SharedMemory(create=True, size=DATA_OFFSET + size)
+        created.add(shm.name)
+        COUNTER.pack_into(shm.buf, CAPACITY_OFFSET, size)
+        for offset in (HEAD_OFFSET, TAIL_OFFSET, WANT_SPACE_OFFSET):
+            COUNTER.pack_into(shm.buf, offset, 0)
+        return cls(shm, True)
+
+    @classmethod
+    def attach(cls, name):
+        """Attaches to a ring created by another process. The block
+        is not tracked by this process, so it is not unlinked when
+        this process exits.
+
+        Parameters
+        ----------
+        name : str
+            name of the shared memory block
+
+        Returns
+        -------
+        ShmRing
+            ring created by the sender
+        """
+        try:
+            shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name)
+            if shm.name not in created:
+                resource_tracker.unregister(shm._name, 'shared_memory')
+        ring = cls(shm, False)
+        if ring.capacity > shm.size - DATA_OFFSET:
+            ring.close()
+            raise ValueError('invalid ring capacity')
+        return ring
+
+    @property
+    def name(self):
+        """Name of the shared memory block."""
+        return self.shm.name
+
+    def fits(self, length):
+        """Returns True if a message of length bytes fits
+        in the empty ring.
+        """
+        return RECORD_HEADER.size + length <= self.capacity
+
+    def write(self, payload, flags=0):
+        """Appends a message to the ring.
+
+        Parameters
+        ----------
+        payload : bytes
+            serialized message
+        flags : int, optional
+            frame flags of the message
+
+        Returns
+        -------
+        bool
+            False if there is not enough free space in the ring
+        """
+        size = RECORD_HEADER.size + len(payload)
+        head = self._get(HEAD_OFFSET)
+        if size > self.capacity - (head - self._get(TAIL_OFFSET)):
+            return False
+        self._put(head, RECORD_HEADER.pack(len(payload), flags))
+        self._put(head + RECORD_HEADER.size, payload)
+        COUNTER.pack_into(self.shm.buf, HEAD_OFFSET, head + size)
+        return True
+
+    def read(self):
+        """Iterates over the messages in the ring, in the form
+        (payload, flags), freeing their space as they are read.
+
+        Raises
+        ------
+        ValueError
+            if the ring holds an invalid message
+        """
+        tail = self._get(TAIL_OFFSET)
+        while tail != self._get(HEAD_OFFSET):
+            length, flags = RECORD_HEADER.unpack(self._take(tail, RECORD_HEADER.size))
+            if RECORD_HEADER.size + length > self.capacity:
+                raise ValueError('invalid message length in ring')
+            payload = self._take(tail + RECORD_HEADER.size, length)
+            tail += RECORD_HEADER.size + length
+            COUNTER.pack_into(self.shm.buf, TAIL_OFFSET, tail)
+            yield payload, flags
+
+    def want_space(self):
+        """Marks that the sender waits for free space, called by
+        the sender before it rings the doorbell.
+        """
+        COUNTER.pack_into(self.shm.buf, WANT_SPACE_OFFSET, 1)
+
+    def take_want_space(self):
+        """Returns True and clears the mark if the sender waits for
+        free space, called by the receiver after reading the ring.
+        """
+        if self._get(WANT_SPACE_OFFSET):
+            COUNTER.pack_into(self.shm.buf, WANT_SPACE_OFFSET, 0)
+            return True
+        return False
+
+    def close(self):
+        """Releases the ring, unlinking the block in the sender."""
+        self.shm.close()
+        if self.owner:
+            created.discard(self.shm.name)
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _get(self, offset):
+        return COUNTER.unpack_from(self.shm.buf, offset)[0]
+
+    def _put(self, position, data):
+        start = position % self.capacity
+        first = min(len(data), self.capacity - start)
+        buf = self.shm.buf
+        data = memoryview(data)
+        buf[DATA_OFFSET + start:DATA_OFFSET + start + first] = data[:first]
+        if first < len(data):
+            buf[DATA_OFFSET:DATA_OFFSET + len(data) - first] = data[first:]
+
+    def _take(self, position, length):
+        start = position % self.capacity
+        first = min(length, self.capacity - start)
+        buf = self.shm.buf
+        # a bytearray, so that the arrays of the content are rebuilt
+        # on it without another copy (see codec.decode)
+        data = bytearray(buf[DATA_OFFSET + start:DATA_OFFSET + start + first])
+        if first < length:
+            data += buf[DATA_OFFSET:DATA_OFFSET + length - first]
+        return data
@@ -134,7 +134,7 @@ class Sniffer(Agent):
         # Ignores messages from AMS
         if 'ams' not in message.sender.name:
             try:
-                content = loads(message.content)
+                content = message.get_content(loads)
                 if content['ref'] == 'MESSAGE':
                     _message = content['message']
                     
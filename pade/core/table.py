@@ -0,0 +1,147 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Agent Table Module
+------------------
+
+This Python module implements the table of active agents kept by
+every agent and distributed by the AMS. The table behaves as the
+dictionary {name: AID} used so far, and keeps indexes by full name
+and by localname so that the receivers of a message are resolved in
+constant time.
+"""
+
+
+class AgentTable(dict):
+    """Dictionary of the active agents, with keys: name and
+    values: AID, indexed by the full name and by the localname
+    of the registered AIDs.
+
+    The table is pickled as a plain dictionary, so it can be sent
+    to agents of any version.
+
+    Attributes
+    ----------
+    names : dictionary
+        index of the table keys by AID full name
+    localnames : dictionary
+        index of the table keys by AID localname
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Init the AgentTable class with the same arguments
+        accepted by dict.
+        """
+        super(AgentTable, self).__init__()
+        self.names = dict()
+        self.localnames = dict()
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, key, aid):
+        if key in self:
+            self._unindex(key, dict.__getitem__(self, key))
+        dict.__setitem__(self, key, aid)
+        self._index(key, aid)
+
+    def __delitem__(self, key):
+        aid = dict.__getitem__(self, key)
+        dict.__delitem__(self, key)
+        self._unindex(key, aid)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+    def pop(self, key, *default):
+        if key in self:
+            aid = dict.__getitem__(self, key)
+            del self[key]
+            return aid
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def popitem(self):
+        key, aid = dict.popitem(self)
+        self._unindex(key, aid)
+        return key, aid
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, aid in dict(*args, **kwargs).items():
+            self[key] = aid
+
+    def clear(self):
+        dict.clear(self)
+        self.names.clear()
+        self.localnames.clear()
+
+    def copy(self):
+        return AgentTable(self)
+
+    def resolve(self, aid):
+        """Returns the AID registered in the table for aid, or None
+        if the agent is not active. The lookup is made by table key,
+        then by full name and then by localname, so AIDs built only
+        from a localname are resolved to the registered address.
+        The aid given is not modified.
+
+        Parameters
+        ----------
+        aid : AID
+            identifier of the agent
+
+        Returns
+        -------
+        AID
+            registered AID, or None
+        """
+        name = aid.name
+        target = dict.get(self, name)
+        if target is not None:
+            return target
+        keys = self.names.get(name)
+        if not keys:
+            keys = self.localnames.get(getattr(aid, 'localname', None))
+            if not keys:
+                return None
+        return dict.__getitem__(self, keys[0])
+
+    def _index(self, key, aid):
+        for index, value in ((self.names, getattr(aid, 'name', None)),
+                             (self.localnames, getattr(aid, 'localname', None))):
+            if value is not None:
+                index.setdefault(value, list()).append(key)
+
+    def _unindex(self, key, aid):
+        for index, value in ((self.names, getattr(aid, 'name', None)),
+                             (self.localnames, getattr(aid, 'localname', None))):
+            keys = index.get(value)
+            if keys is not None and key in keys:
+                keys.remove(key)
+                if not keys:
+                    del index[value]
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cost of the AID operations found on the message dispatch paths.
+
+Each operation is repeated and its mean time per call is printed in
+microseconds, for AIDs built by the AID class, as the agents create
+them, and for the interned AIDs the received messages carry: creating
+one from a name, comparing two AIDs of the same agent, hashing, and
+filtering a message by its sender.
+
+Usage: python aid_operations.py [repetitions]
+"""
+
+import sys
+import timeit
+
+from pade.acl.aid import AID, intern_aid
+from pade.acl.filters import Filter
+from pade.acl.messages import ACLMessage
+
+NAME = 'collector@localhost:20001'
+
+
+def run(repetitions):
+    built = AID(NAME)
+    interned = intern_aid(NAME)
+    message = ACLMessage(ACLMessage.INFORM)
+    message.set_sender(interned)
+    sender_filter = Filter()
+    sender_filter.set_sender(interned)
+    operations = [
+        ('AID(name)', lambda: AID(NAME)),
+        ('intern_aid', lambda: intern_aid(NAME)),
+        ('AID == AID', lambda: built == AID(NAME)),
+        ('interned ==', lambda: interned == intern_aid(NAME)),
+        ('hash AID', lambda: hash(built)),
+        ('hash interned', lambda: hash(interned)),
+        ('filter sender', lambda: sender_filter.filter(message)),
+    ]
+    for name, operation in operations:
+        seconds = timeit.timeit(operation, number=repetitions)
+        print('{:14s} {:8.2f} us'.format(name, seconds / repetitions * 1e6))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cost of moving NumPy arrays in the content of ACL messages.
+
+For load profiles of increasing size, prints the time to encode and
+decode a message whose content is the array, and to read the content,
+with the whole message pickled and with the binary codec, which sends
+the array data out of band and rebuilds the array on the received data.
+Both payloads are copied into a bytearray, as the receive buffer of a
+connection does.
+
+Usage: python array_content.py [repetitions]
+"""
+
+import pickle
+import sys
+import timeit
+
+import numpy as np
+
+from pade.acl import codec
+from pade.acl.messages import ACLMessage
+
+SIZES = [1000, 100000, 1000000]
+
+
+def message(size):
+    message = ACLMessage(ACLMessage.INFORM)
+    message.set_ontology('load profile')
+    message.set_content({'bus': 12, 'load': np.random.random(size)})
+    return message
+
+
+def pickled(message):
+    return pickle.loads(bytearray(pickle.dumps(message))).content
+
+
+def encoded(message):
+    return codec.decode(bytearray(codec.encode(message))).content
+
+
+def run(repetitions):
+    print('{:>9s} {:8s} {:>12s}'.format('elements', 'format', 'us/message'))
+    for size in SIZES:
+        msg = message(size)
+        for name, transfer in [('pickle', pickled), (codec.FORMAT, encoded)]:
+            assert np.array_equal(transfer(msg)['load'], msg.content['load'])
+            seconds = timeit.timeit(lambda: transfer(msg), number=repetitions)
+            print('{:9d} {:8s} {:12.1f}'.format(size, name, seconds / repetitions * 1e6))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
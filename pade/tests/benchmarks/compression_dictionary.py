@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Preset dictionary of the 'zlib-acl2' compression codec.
+
+Builds the dictionary from the encodings of typical messages: an
+INFORM encoded with the binary codec, the same message pickled for the
+agents that do not read the codec, and the agent table that the AMS
+sends to every agent. With --print, prints it as the ACL_DICTIONARY
+literal of pade.core.compression.
+
+Then prints, for messages of several agent tables, the compressed
+size with plain zlib and with the 'zlib-acl2' codec.
+
+Usage: python compression_dictionary.py [--print]
+"""
+
+import pickle
+import sys
+
+from pade.acl import codec
+from pade.acl.aid import AID
+from pade.acl.messages import ACLMessage
+from pade.core import compression
+from pade.core.table import AgentTable
+
+
+def agent(name, port, socket_dir=None):
+    aid = AID('{}@localhost:{}'.format(name, port))
+    if socket_dir is not None:
+        aid.addEndpoint('unix', '{}/{}-{}.sock'.format(socket_dir, name, port))
+    return aid
+
+
+def table(size, socket_dir=None):
+    agents = [agent('agent_{}'.format(i), 20000 + i, socket_dir) for i in range(size)]
+    agents.append(AID('ams@localhost:8000'))
+    return AgentTable(dict((aid.name, aid) for aid in agents))
+
+
+def inform(content, sender, receiver):
+    message = ACLMessage(ACLMessage.INFORM)
+    message.set_sender(sender)
+    message.add_receiver(receiver)
+    message.set_protocol(ACLMessage.FIPA_SUBSCRIBE_PROTOCOL)
+    message.set_conversation_id('0123456789abcdef-1')
+    message.set_message_id()
+    message.set_datetime_now()
+    message.set_system_message(True)
+    message.set_content(content)
+    return message
+
+
+def samples():
+    """Returns the encodings the dictionary is made of, the most
+    frequent at the end."""
+    ams = AID('ams@localhost:8000')
+    receiver = agent('agent_1', 20001, '/tmp/pade')
+    message = inform(b'', ams, receiver)
+    return [pickle.dumps(message), codec.encode(message),
+            pickle.dumps(table(2, '/tmp/pade'))]
+
+
+def build():
+    return b''.join(samples())
+
+
+def run(show):
+    if show:
+        dictionary = build()
+        print('ACL_DICTIONARY = (')
+        for start in range(0, len(dictionary), 48):
+            print('    {!r}'.format(dictionary[start:start + 48]))
+        print(')')
+        return
+    print('{:>7s} {:8s} {:>9s} {:>9s} {:>10s}'.format(
+        'agents', 'format', 'bytes', 'zlib', 'zlib-acl2'))
+    ams = AID('ams@localhost:8000')
+    for size in (20, 100, 500):
+        for socket_dir in (None, '/run/agents'):
+            content = pickle.dumps(table(size, socket_dir))
+            message = inform(content, ams, agent('agent_7', 20007, socket_dir))
+            for name, payload in [('pickle', pickle.dumps(message)),
+                                  (codec.FORMAT, codec.encode(message))]:
+                print('{:7d} {:8s} {:9d} {:9d} {:10d}'.format(
+                    size, name, len(payload),
+                    len(compression.compress('zlib', payload)),
+                    len(compression.compress('zlib-acl2', payload))))
+
+
+if __name__ == '__main__':
+    run('--print' in sys.argv[1:])
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Throughput of the agent wire protocol for large messages.
+
+Each ACL message carries a load profile of 1 MB to 100 MB (a NumPy
+array when NumPy is installed, raw bytes otherwise). The message is
+pickled, framed by PeerProtocol.send_frame and fed back to a receiving
+PeerProtocol in 64 KB chunks, as a TCP connection would deliver it.
+With --legacy, the receive loop used before the bytearray buffer
+(bytes concatenation) is measured too, up to 10 MB.
+
+Usage: python frame_throughput.py [--legacy] [sizes in MB ...]
+"""
+
+import pickle
+import sys
+import time
+
+from twisted.internet.testing import StringTransport
+
+from pade.acl.aid import AID
+from pade.acl.messages import ACLMessage
+from pade.core.peer import PeerProtocol
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CHUNK_SIZE = 64 * 1024
+MB = 1024 * 1024
+
+
+class Factory(object):
+    max_frame_size = None
+
+
+class Receiver(PeerProtocol):
+    payload = None
+
+    def frame_received(self, payload, flags):
+        self.payload = payload
+
+
+def load_profile(size):
+    if numpy is not None:
+        return numpy.random.default_rng(0).random(size // 8)
+    return bytes(size)
+
+
+def chunks(data):
+    view = memoryview(data)
+    for offset in range(0, len(view), CHUNK_SIZE):
+        yield view[offset:offset + CHUNK_SIZE].tobytes()
+
+
+def legacy_receive(data):
+    message = None
+    for chunk in chunks(data):
+        if message is not None:
+            message += chunk
+        else:
+            message = chunk
+    return message
+
+
+def run(size, legacy):
+    message = ACLMessage(ACLMessage.INFORM)
+    message.set_sender(AID('sender@localhost:20000'))
+    message.add_receiver(AID('receiver@localhost:20001'))
+    message.set_content(load_profile(size))
+
+    t0 = time.perf_counter()
+    payload = pickle.dumps(message)
+    t1 = time.perf_counter()
+
+    sender = PeerProtocol(Factory())
+    sender.makeConnection(StringTransport())
+    sender.send_frame(payload)
+    wire = sender.transport.value()
+    t2 = time.perf_counter()
+
+    receiver = Receiver(Factory())
+    receiver.makeConnection(StringTransport())
+    for chunk in chunks(wire):
+        receiver.dataReceived(chunk)
+    t3 = time.perf_counter()
+
+    pickle.loads(receiver.payload)
+    t4 = time.perf_counter()
+
+    mb = len(payload) / MB
+    row = '{:8.1f} MB  encode {:8.1f} MB/s  send {:8.1f} MB/s  receive {:8.1f} MB/s  decode {:8.1f} MB/s'.format(
+        mb, mb / (t1 - t0), mb / (t2 - t1), mb / (t3 - t2), mb / (t4 - t3))
+    if legacy and size <= 10 * MB:
+        t5 = time.perf_counter()
+        legacy_receive(wire)
+        row += '  legacy receive {:8.1f} MB/s'.format(mb / (time.perf_counter() - t5))
+    print(row)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    legacy = '--legacy' in args
+    sizes = [int(arg) for arg in args if arg != '--legacy'] or [1, 10, 50, 100]
+    print('payload: {}'.format('numpy float64 array' if numpy is not None else 'bytes'))
+    for size in sizes:
+        run(size * MB, legacy)
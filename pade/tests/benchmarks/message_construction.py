@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cost of the ACLMessage operations found on the message hot paths.
+
+Each operation is repeated and its mean time per call is printed in
+microseconds: building a message, replying to it, copying it for a
+receiver of the same process, pickling it and building its XML.
+
+Usage: python message_construction.py [repetitions]
+"""
+
+import pickle
+import sys
+import timeit
+
+from pade.acl.aid import AID
+from pade.acl.messages import ACLMessage
+
+SENDER = AID('sender@localhost:20000')
+RECEIVER = AID('receiver@localhost:20001')
+
+
+def construct():
+    return ACLMessage(ACLMessage.INFORM)
+
+
+def build():
+    message = ACLMessage(ACLMessage.REQUEST)
+    message.set_sender(SENDER)
+    message.add_receiver(RECEIVER)
+    message.set_protocol(ACLMessage.FIPA_REQUEST_PROTOCOL)
+    message.set_ontology('measurements')
+    message.set_content('voltage 1.02 pu')
+    message.set_datetime_now()
+    return message
+
+
+def run(repetitions):
+    message = build()
+    payload = pickle.dumps(message)
+    operations = [
+        ('construct', construct),
+        ('build', build),
+        ('create_reply', message.create_reply),
+        ('snapshot', message.snapshot),
+        ('pickle.dumps', lambda: pickle.dumps(message)),
+        ('pickle.loads', lambda: pickle.loads(payload)),
+        ('get_message', message.get_message),
+    ]
+    for name, operation in operations:
+        seconds = timeit.timeit(operation, number=repetitions)
+        print('{:14s} {:8.2f} us'.format(name, seconds / repetitions * 1e6))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
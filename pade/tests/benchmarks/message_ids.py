@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cost of the identifiers and timestamps of the ACL messages.
+
+Prints the number of identifiers and timestamps generated per second,
+and the number of messages constructed and stamped as Agent_.send does
+per second, with the uuid1 identifiers the messages used to have and
+with the default generator of pade.acl.ids.
+
+Usage: python message_ids.py [repetitions]
+"""
+
+import sys
+import timeit
+from datetime import datetime
+from time import time_ns
+from uuid import uuid1
+
+from pade.acl import ids
+from pade.acl.messages import ACLMessage
+
+
+def uuid1_id():
+    return str(uuid1())
+
+
+def stamped():
+    message = ACLMessage(ACLMessage.INFORM)
+    message.set_message_id()
+    message.set_datetime_now()
+    return message
+
+
+def rate(operation, repetitions):
+    return repetitions / timeit.timeit(operation, number=repetitions)
+
+
+def run(repetitions):
+    print('{:22s} {:>12s}'.format('operation', 'per second'))
+    for name, operation in [('uuid1 id', uuid1_id),
+                            ('new_id', ids.new_id),
+                            ('datetime.now', datetime.now),
+                            ('time_ns', time_ns)]:
+        print('{:22s} {:12.0f}'.format(name, rate(operation, repetitions)))
+    for name, generator in [('messages (uuid1 ids)', uuid1_id),
+                            ('messages (new_id)', None)]:
+        previous = ids.set_id_generator(generator)
+        print('{:22s} {:12.0f}'.format(name, rate(stamped, repetitions)))
+        ids.set_id_generator(previous)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
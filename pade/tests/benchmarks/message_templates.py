@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cost of the periodic messages built from a MessageTemplate.
+
+Prints the number of telemetry messages per second that are built,
+stamped as Agent_.send does and encoded with the binary codec, when
+each message is built from scratch and when it is made from a
+template.
+
+Usage: python message_templates.py [repetitions]
+"""
+
+import sys
+import timeit
+
+from pade.acl import codec
+from pade.acl.aid import AID
+from pade.acl.messages import ACLMessage, MessageTemplate
+
+SENDER = AID('meter@localhost:20000')
+RECEIVERS = [AID('collector@localhost:20001')]
+
+
+def prototype():
+    message = ACLMessage(ACLMessage.INFORM)
+    message.set_protocol(ACLMessage.FIPA_SUBSCRIBE_PROTOCOL)
+    message.set_ontology('telemetry')
+    message.set_language('text')
+    message.set_conversation_id('meter-telemetry')
+    for receiver in RECEIVERS:
+        message.add_receiver(receiver)
+    return message
+
+
+def stamp(message):
+    message.set_sender(SENDER)
+    message.set_message_id()
+    message.set_datetime_now()
+    return codec.encode(message)
+
+
+def from_scratch():
+    message = prototype()
+    message.set_content('load 1.02 pu')
+    return stamp(message)
+
+
+TEMPLATE = MessageTemplate(prototype())
+
+
+def from_template():
+    return stamp(TEMPLATE.message('load 1.02 pu'))
+
+
+def run(repetitions):
+    assert codec.decode(from_template()).ontology == 'telemetry'
+    for name, operation in [('from scratch', from_scratch),
+                            ('from template', from_template)]:
+        seconds = timeit.timeit(operation, number=repetitions)
+        print('{:14s} {:10.0f} messages/s'.format(name, repetitions / seconds))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
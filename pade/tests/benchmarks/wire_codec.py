@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Wire formats of the ACL messages: pickle against the binary codec.
+
+For a few typical messages, prints the encoded size and the number
+of messages encoded and decoded per second with pickle and with the
+codec of pade.acl.codec.
+
+Usage: python wire_codec.py [repetitions]
+"""
+
+import pickle
+import sys
+import timeit
+
+from pade.acl import codec
+from pade.acl.aid import AID
+from pade.acl.messages import ACLMessage
+
+
+def message(content, receivers=1):
+    message = ACLMessage(ACLMessage.INFORM)
+    message.set_sender(AID('sensor@localhost:20000'))
+    for i in range(receivers):
+        message.add_receiver(AID('collector{}@localhost:{}'.format(i, 20001 + i)))
+    message.set_protocol(ACLMessage.FIPA_REQUEST_PROTOCOL)
+    message.set_ontology('measurements')
+    message.set_content(content)
+    message.set_datetime_now()
+    return message
+
+
+MESSAGES = [
+    ('text content', message('voltage 1.02 pu')),
+    ('dict content', message({'bus': 12, 'voltage': [1.02, 1.01, 0.99]})),
+    ('10 receivers', message('voltage 1.02 pu', receivers=10)),
+    ('64 KB bytes', message(bytes(64 * 1024))),
+]
+
+FORMATS = [
+    ('pickle', pickle.dumps, pickle.loads),
+    (codec.FORMAT, codec.encode, codec.decode),
+]
+
+
+def run(repetitions):
+    print('{:14s} {:8s} {:>9s} {:>12s} {:>12s}'.format(
+        'message', 'format', 'bytes', 'encode/s', 'decode/s'))
+    for name, msg in MESSAGES:
+        for wire_format, encode, decode in FORMATS:
+            data = encode(msg)
+            encode_time = timeit.timeit(lambda: encode(msg), number=repetitions)
+            decode_time = timeit.timeit(lambda: decode(data), number=repetitions)
+            print('{:14s} {:8s} {:9d} {:12.0f} {:12.0f}'.format(
+                name, wire_format, len(data),
+                repetitions / encode_time, repetitions / decode_time))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
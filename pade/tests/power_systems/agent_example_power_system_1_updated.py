@@ -8,7 +8,7 @@ Migrated to Python 3.12.11 - GREI/UFC project
 
 from pade.misc.utility import display_message, start_loop
 from pade.core.agent import Agent
-from pade.acl.messages import ACLMessage
+from pade.acl.messages import ACLMessage, MessageTemplate
 from pade.acl.aid import AID
 from pade.behaviours.protocols import FipaRequestProtocol, TimedBehaviour
 from pade.misc.data_logger import get_shared_session_id, logger
@@ -72,11 +72,13 @@ class TimedTriggerBehaviour(TimedBehaviour):
     def __init__(self, agent, time, message):
         super().__init__(agent, time)
         self.message = message
+        # Every request is a new message built from the same template.
+        self.template = MessageTemplate(message)
 
     def on_time(self):
         super().on_time()
         display_message(self.agent.aid.localname, "Timed trigger fired. Requesting a new power flow reading.")
-        self.agent.send(self.message)
+        self.agent.send(self.template.message())
 
 
 def serialize_voltage_profile(voltage_array: np.ndarray) -> dict:
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Endpoints of the agents in the binary codec.
+
+This test verifies:
+- A message from an agent that publishes endpoints is encoded with
+  the binary codec instead of being pickled
+- The endpoints of its agents are decoded with their values
+"""
+
+from pade.acl import codec
+from pade.acl.aid import AID, InternedAID
+from pade.acl.messages import ACLMessage
+from pade.core.agent import Agent_
+from pade.core.pool import UNIX
+from pade.core.shm import SHM
+
+
+def test_message_from_agent_with_endpoints_is_encoded(tmp_path):
+    agent = Agent_(AID('endpoints@localhost:20200'))
+    agent.transport = {'unix_socket_dir': str(tmp_path), 'shm_ring_size': 1 << 20}
+    agent.update_ams({'name': 'localhost', 'port': 20000})
+    factory = agent.agentInstance
+    assert agent.aid.getEndpoints()
+
+    message = ACLMessage(ACLMessage.INFORM)
+    message.set_sender(agent.aid)
+    message.add_receiver(AID('receiver@localhost:20201'))
+    message.set_content('load 1.02 pu')
+    payload = factory.encode(message, codec.FORMAT)
+    assert payload[:3] == codec.MAGIC + bytes([codec.VERSION])
+    assert factory.stats['codec_fallbacks'] == 0
+
+    decoded = codec.decode(payload)
+    assert decoded.sender == agent.aid
+    assert decoded.sender.getEndpoint(UNIX) == agent.aid.getEndpoint(UNIX)
+    assert decoded.sender.getEndpoint(SHM) == 1 << 20
+    assert type(decoded.receivers[0]) is InternedAID
+    assert decoded.content == 'load 1.02 pu'
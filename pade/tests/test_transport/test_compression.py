@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Preset dictionary of the 'zlib-acl2' compression codec.
+
+This test verifies:
+- Typical messages, encoded with the binary codec or pickled, are
+  compressed smaller by 'zlib-acl2' than by plain zlib
+- They are decompressed back to the same bytes
+"""
+
+import pickle
+
+from pade.acl import codec
+from pade.acl.aid import AID
+from pade.acl.messages import ACLMessage
+from pade.core import compression
+from pade.core.table import AgentTable
+
+
+def typical_messages():
+    agents = [AID('meter_{}@localhost:{}'.format(i, 30000 + i)) for i in range(40)]
+    agents[0].addEndpoint('unix', '/var/run/pade/meter_0-30000.sock')
+    table = AgentTable(dict((aid.name, aid) for aid in agents))
+    ams = AID('ams@localhost:8000')
+
+    update = ACLMessage(ACLMessage.INFORM)
+    update.set_sender(ams)
+    update.add_receiver(agents[1])
+    update.set_protocol(ACLMessage.FIPA_SUBSCRIBE_PROTOCOL)
+    update.set_system_message(True)
+    update.set_message_id()
+    update.set_datetime_now()
+    update.set_content(pickle.dumps(table))
+
+    request = ACLMessage(ACLMessage.REQUEST)
+    request.set_sender(agents[2])
+    for aid in agents[3:20]:
+        request.add_receiver(aid)
+    request.set_protocol(ACLMessage.FIPA_REQUEST_PROTOCOL)
+    request.set_ontology('power flow')
+    request.set_conversation_id('feeder-12')
+    request.set_message_id()
+    request.set_datetime_now()
+    request.set_content('set point 0.98 pu on bus 12')
+
+    for message in (update, request):
+        yield codec.encode(message)
+        yield pickle.dumps(message)
+
+
+def test_dictionary_beats_plain_zlib():
+    for payload in typical_messages():
+        compressed = compression.compress('zlib-acl2', payload)
+        assert len(compressed) < len(compression.compress('zlib', payload))
+        assert compression.decompress('zlib-acl2', compressed) == payload
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+UDP port of the agents.
+
+This test verifies:
+- An agent created with udp_port=0 binds a port chosen by the system
+- The bound port, not 0, is the UDP endpoint published in its AID
+"""
+
+from pade.acl.aid import AID
+from pade.core.agent import Agent_
+from pade.core.datagram import UDP
+
+
+def test_udp_port_zero_publishes_bound_port():
+    agent = Agent_(AID('datagrams@localhost:20100'))
+    agent.transport = {'udp_port': 0}
+    agent.update_ams({'name': 'localhost', 'port': 20000})
+    factory = agent.agentInstance
+    try:
+        port = factory.datagram_port.getHost().port
+        assert port != 0
+        assert agent.aid.getEndpoint(UDP) == port
+    finally:
+        factory.datagram_port.stopListening()